@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Автор с группой, подписчик и 12 постов"""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_slug', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(12):
+            Post.objects.create(
+                text=f'Тестовый текст {i}', author=cls.author, group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_share_html_pages(self):
+        """Ленты API отдают те же страницы, что и HTML-ленты."""
+        self.client.force_login(self.reader)
+        urls = {
+            reverse('api:posts'): reverse('posts:index'),
+            reverse('api:group_posts', args=['test_slug']):
+                reverse('posts:group_list', args=['test_slug']),
+            reverse('api:profile_posts', args=['NoName']):
+                reverse('posts:profile', args=['NoName']),
+            reverse('api:follow'): reverse('posts:follow_index'),
+        }
+        for api_url, html_url in urls.items():
+            with self.subTest(url=api_url):
+                data = self.client.get(api_url).json()
+                page = self.client.get(html_url).context['page_obj']
+                self.assertEqual(
+                    [post['id'] for post in data['results']],
+                    [post.pk for post in page],
+                )
+                self.assertEqual(data['next'], page.next_cursor)
+                self.assertEqual(data['results'][0]['group'], 'test_slug')
+
+    def test_not_modified_until_page_changes(self):
+        """С If-None-Match ответ 304, пока страница не изменилась."""
+        url = reverse('api:posts')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(
+            post=Post.objects.first(), author=self.reader, text='Текст'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['comments'], 1)
+
+    def test_post_without_author(self):
+        """Пост удалённого автора отдаётся с author = null."""
+        post = Post.objects.create(text='Пост без автора')
+        data = self.client.get(reverse('api:posts')).json()
+        self.assertEqual(data['results'][0]['id'], post.pk)
+        self.assertIsNone(data['results'][0]['author'])
+
+    def test_follow_requires_login(self):
+        """Лента подписок без авторизации — 401."""
+        response = self.client.get(reverse('api:follow'))
+        self.assertEqual(response.status_code, 401)
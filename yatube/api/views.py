@@ -0,0 +1,115 @@
+"""
+Read-only JSON API лент: те же выборки и кеш страниц, что у HTML.
+
+Каждый ответ несёт ``ETag`` и ``Last-Modified`` страницы; клиент,
+который опрашивает ленту с ``If-None-Match`` или
+``If-Modified-Since``, получает ``304`` без тела, пока страница не
+изменилась.
+"""
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from core.routers import read_from_replica
+from posts import feed_cache
+from posts.feed_cache import CachedCursorPaginator, CachedTimelinePaginator
+from posts.models import Group, Post
+from posts.views import POSTS_ON_PAGE
+
+User = get_user_model()
+
+JSON_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+def serialize(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username if post.author_id else None,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'comments': post.comment_count,
+    }
+
+
+def validators(page):
+    """
+    ``ETag`` из id, версий карточек и даты новейшего поста страницы и
+    ``Last-Modified`` по этой дате. Правка поста или новый комментарий
+    меняют версию карточки, а с ней и ``ETag``.
+    """
+    if not page.object_list:
+        return quote_etag('empty'), None
+    newest = max(post.pub_date for post in page)
+    raw = '|'.join(
+        [newest.isoformat(), page.previous_cursor or '']
+        + [f'{post.pk}:{post.cache_version}' for post in page]
+    )
+    etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    return etag, int(newest.timestamp())
+
+
+def page_response(request, paginator, private=False):
+    page = paginator.get_page(request.GET.get('cursor'))
+    etag, last_modified = validators(page)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = JsonResponse({
+            'results': [serialize(post) for post in page],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }, json_dumps_params=JSON_PARAMS)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    # Кешировать можно, но перед каждым показом сверяясь с сервером.
+    response['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    if private:
+        patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+@read_from_replica
+def posts(request):
+    return page_response(request, CachedCursorPaginator(
+        Post.objects.feed(), POSTS_ON_PAGE, count=False,
+        feed=feed_cache.index_feed(),
+    ))
+
+
+@read_from_replica
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return page_response(request, CachedCursorPaginator(
+        group.posts.feed(), POSTS_ON_PAGE, count=False,
+        feed=feed_cache.group_feed(group.pk),
+    ))
+
+
+@read_from_replica
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return page_response(request, CachedCursorPaginator(
+        author.posts.feed(), POSTS_ON_PAGE, count=False,
+        feed=feed_cache.profile_feed(author.pk),
+    ))
+
+
+@read_from_replica
+def follow(request):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'detail': 'Нужна авторизация'}, status=401,
+            json_dumps_params=JSON_PARAMS,
+        )
+    return page_response(
+        request, CachedTimelinePaginator(request.user, POSTS_ON_PAGE),
+        private=True,
+    )
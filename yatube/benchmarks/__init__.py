@@ -0,0 +1,5 @@
+"""
+Бенчмарки Yatube. Запускаются из каталога с manage.py, например::
+
+    python -m benchmarks.cache_workers
+"""
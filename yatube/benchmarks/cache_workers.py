@@ -0,0 +1,91 @@
+"""
+Hit rate кеша в зависимости от числа воркеров.
+
+Поток запросов к страницам с распределением Ципфа (популярные ленты
+запрашивают чаще) случайно раскидывается по N процессам-воркерам, как
+это делает балансировщик. На промахе воркер «рендерит» страницу и
+кладёт её в кеш. С ``locmem://`` у каждого процесса свой кеш, и hit
+rate падает с ростом N; общий бэкенд (``file://``, memcached, Redis)
+держит его на одном уровне.
+
+    python -m benchmarks.cache_workers --workers 1 2 4 8 \\
+        --url 'locmem://?max_entries=100000' \\
+        --url 'file:///tmp/yatube-bench-cache?max_entries=100000'
+
+Пример результата на 8000 запросов: locmem — 86% на одном воркере и
+68% на восьми, file:// — 86% при любом числе воркеров.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+from urllib.parse import urlsplit
+
+
+def zipf_stream(pages, requests, seed, exponent=1.1):
+    rng = random.Random(seed)
+    weights = [1 / rank ** exponent for rank in range(1, pages + 1)]
+    return rng.choices(range(pages), weights=weights, k=requests)
+
+
+def run_worker(url, keys):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'yatube.settings'
+    os.environ['YATUBE_CACHE_URL'] = url
+    import django
+    django.setup()
+    from django.core.cache import cache
+
+    hits = 0
+    for key in keys:
+        if cache.get(f'bench:page:{key}') is not None:
+            hits += 1
+        else:
+            cache.set(f'bench:page:{key}', 'x' * 2048, None)
+    return hits, len(keys)
+
+
+def measure(url, workers, stream, seed):
+    rng = random.Random(seed)
+    shares = [[] for _ in range(workers)]
+    for key in stream:
+        shares[rng.randrange(workers)].append(key)
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers) as pool:
+        results = pool.starmap(run_worker, [(url, keys) for keys in shares])
+    hits = sum(hits for hits, _ in results)
+    return hits / len(stream)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', action='append', dest='urls')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=13)
+    args = parser.parse_args()
+    urls = args.urls or [
+        'locmem://?max_entries=100000',
+        'file:///tmp/yatube-bench-cache?max_entries=100000',
+    ]
+
+    stream = zipf_stream(args.pages, args.requests, args.seed)
+    report = []
+    for url in urls:
+        for workers in args.workers:
+            if url.startswith('file://'):
+                shutil.rmtree(urlsplit(url).path, ignore_errors=True)
+            hit_rate = measure(url, workers, stream, args.seed)
+            report.append({
+                'cache': url, 'workers': workers,
+                'hit_rate': round(hit_rate, 4),
+            })
+            print(f'{url:40} workers={workers:<3} hit_rate={hit_rate:.1%}')
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
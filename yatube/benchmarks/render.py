@@ -0,0 +1,106 @@
+"""
+Бенчмарк рендера страницы ленты из 10 постов.
+
+Одна и та же страница (``posts/index.html`` с первыми постами ленты)
+рендерится ``--repeat`` раз в трёх режимах:
+
+* ``loaders`` — загрузчики без кеша, как при ``DEBUG``: каждый рендер
+  заново читает и компилирует шаблоны, карточки рендерятся заново;
+* ``cached`` — кешированный загрузчик, карточки рендерятся заново;
+* ``fragments`` — кешированный загрузчик и карточки из кеша фрагментов.
+
+Запросы к базе делаются один раз до замеров, меряется только рендер.
+
+    python -m benchmarks.render --database /tmp/yatube-bench.sqlite3
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.views import percentile, setup
+
+MODES = ('loaders', 'cached', 'fragments')
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def make_engine(cached):
+    from django.conf import settings
+    from django.template import Engine
+    from django.template.backends.django import get_installed_libraries
+
+    options = settings.TEMPLATES[0]
+    loaders = [('django.template.loaders.cached.Loader', LOADERS)] \
+        if cached else LOADERS
+    return Engine(
+        dirs=options['DIRS'], loaders=loaders,
+        context_processors=options['OPTIONS']['context_processors'],
+        libraries=get_installed_libraries(),
+    )
+
+
+def page_context():
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+
+    from posts.feed_cache import CachedCursorPaginator
+    from posts.models import Post
+
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    paginator = CachedCursorPaginator(Post.objects.feed(), 10, count=False)
+    page_obj = paginator.page()
+    # Все запросы страницы (и копии картинок) — до замеров.
+    list(page_obj)
+    return request, {
+        'title': 'Бенчмарк', 'paginator': paginator, 'page_obj': page_obj,
+    }
+
+
+def run_mode(mode, request, context, repeat):
+    from django.core.cache import cache
+    from django.template import RequestContext
+
+    engine = make_engine(cached=mode != 'loaders')
+    timings = []
+    for _ in range(repeat):
+        if mode != 'fragments':
+            cache.clear()
+        start = time.perf_counter()
+        template = engine.get_template('posts/index.html')
+        template.render(RequestContext(request, context))
+        timings.append(time.perf_counter() - start)
+    # Первый рендер греет кеши, в статистику он не идёт.
+    timings = timings[1:]
+    ordered = sorted(timings)
+    return {
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'p50_ms': percentile(ordered, 50, digits=3),
+        'p95_ms': percentile(ordered, 95, digits=3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--database', help='Файл SQLite с данными')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    args = parser.parse_args()
+
+    setup(args.database)
+    request, context = page_context()
+    if not context['page_obj'].object_list:
+        parser.error('В базе нет постов: наполните её seed_yatube')
+    baseline = None
+    for mode in args.modes:
+        result = run_mode(mode, request, context, args.repeat)
+        baseline = baseline or result['mean_ms']
+        print(f'{mode:10} mean={result["mean_ms"]}ms '
+              f'p50={result["p50_ms"]}ms p95={result["p95_ms"]}ms '
+              f'x{baseline / result["mean_ms"]:.1f}')
+
+
+if __name__ == '__main__':
+    main()
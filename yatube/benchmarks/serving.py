@@ -0,0 +1,156 @@
+"""
+Пропускная способность N процессов-воркеров на одной базе SQLite.
+
+Как ``benchmarks.cache_workers``, поток запросов раскидывается по
+``--workers`` процессам; каждый отвечает на свою долю тестовым клиентом
+Django, а с долей ``--writes`` вместо чтения пишет комментарий, как
+посетитель. Сравниваются профили соединений:
+
+* ``default`` — соединение на каждый запрос, журнал ``delete``;
+* ``tuned`` — как в ``yatube/production.py``: соединение живёт между
+  запросами, WAL, ``synchronous=normal`` и ``busy_timeout``.
+
+Режим журнала сохраняется в файле базы, поэтому ``default`` выставляет
+``delete`` явно.
+
+    python -m benchmarks.serving --database /tmp/yatube-bench.sqlite3 \\
+        --workers 1 2 4 8
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import time
+
+from benchmarks.views import pick_urls, setup
+
+PROFILES = {
+    'default': {'conn_max_age': 0, 'pragmas': {'journal_mode': 'delete'}},
+    'tuned': {
+        'conn_max_age': 60,
+        'pragmas': {
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'busy_timeout': 5000,
+        },
+    },
+}
+PAGES = ('index', 'group_list', 'profile', 'post_detail')
+
+
+def run_worker(database, profile, cache_url, jobs, barrier, results):
+    import os
+    os.environ['YATUBE_CACHE_URL'] = cache_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    from django.conf import settings
+    settings.DATABASES['default']['CONN_MAX_AGE'] = profile['conn_max_age']
+    settings.SQLITE_PRAGMAS = profile['pragmas']
+    setup(database)
+    from django.db import OperationalError, close_old_connections
+    from django.test import Client
+
+    from posts.models import Comment
+
+    client = Client()
+    errors = 0
+    barrier.wait()
+    started = time.perf_counter()
+    for url, post_id, author_id in jobs:
+        try:
+            if url:
+                errors += client.get(url).status_code >= 400
+            else:
+                Comment.objects.create(
+                    post_id=post_id, author_id=author_id, text='Бенчмарк'
+                )
+        except OperationalError:
+            errors += 1
+        finally:
+            # Конец «запроса»: тестовый клиент делает то же сам.
+            close_old_connections()
+    results.put((len(jobs), errors, time.perf_counter() - started))
+
+
+def make_jobs(requests, writes, seed):
+    """Адреса страниц вперемешку с комментариями ``(None, пост, автор)``."""
+    from django.contrib.auth import get_user_model
+
+    from posts.models import Post
+
+    rng = random.Random(seed)
+    urls, _ = pick_urls(PAGES, requests, seed)
+    reads = [url for page_urls in urls.values() for url in page_urls]
+    post_ids = list(Post.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    )[:1000])
+    user_ids = list(get_user_model().objects.values_list(
+        'pk', flat=True
+    )[:1000])
+    jobs = []
+    for url in rng.sample(reads, min(requests, len(reads))):
+        if rng.random() < writes:
+            jobs.append((None, rng.choice(post_ids), rng.choice(user_ids)))
+        else:
+            jobs.append((url, None, None))
+    return jobs
+
+
+def measure(database, profile, cache_url, workers, jobs):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=run_worker, args=(
+            database, profile, cache_url, jobs[number::workers],
+            barrier, results,
+        ))
+        for number in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    done = sum(count for count, _, _ in reports)
+    elapsed = max(seconds for _, _, seconds in reports)
+    return {
+        'requests': done,
+        'errors': sum(errors for _, errors, _ in reports),
+        'throughput_rps': round(done / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--database', required=True,
+                        help='Файл SQLite с данными')
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES,
+                        default=list(PROFILES))
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--writes', type=float, default=0.05,
+                        help='Доля запросов, которые пишут комментарий')
+    parser.add_argument('--cache-url', default='locmem://')
+    parser.add_argument('--seed', type=int, default=13)
+    args = parser.parse_args()
+
+    setup(args.database)
+    jobs = make_jobs(args.requests, args.writes, args.seed)
+    if not jobs:
+        parser.error('В базе нет постов: наполните её seed_yatube')
+    report = []
+    for name in args.profiles:
+        for workers in args.workers:
+            result = measure(
+                args.database, PROFILES[name], args.cache_url, workers, jobs
+            )
+            report.append({'profile': name, 'workers': workers, **result})
+            print(f'{name:8} workers={workers:<3} '
+                  f'rps={result["throughput_rps"]} '
+                  f'errors={result["errors"]}')
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Нагрузочный бенчмарк страниц index, group_list, profile, post_detail и
+follow_index.
+
+Каждую страницу запрашивают ``--requests`` раз в ``--concurrency``
+потоков: через тестовый клиент Django (``--mode client``) или по HTTP
+через локальный WSGI-сервер в том же процессе (``--mode server``).
+Адреса выбираются детерминированно: популярные группы, авторы и посты
+чаще, как в живом трафике. В отчёте для каждой страницы — p50/p95/p99
+задержки, среднее число SQL-запросов (из ``core.metrics``) и пропускная
+способность; JSON из ``--output`` можно потом передать в ``--compare``.
+
+    python -m benchmarks.views --database /tmp/yatube-bench.sqlite3 \\
+        --load --users 1000 --posts 20000 --output baseline.json
+    python -m benchmarks.views --database /tmp/yatube-bench.sqlite3 \\
+        --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+PAGES = ('index', 'group_list', 'profile', 'post_detail', 'follow_index')
+
+
+def setup(database):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    from django.conf import settings
+    if database:
+        settings.DATABASES['default']['NAME'] = database
+    # Мерим как в бою: без отладки, тулбара и журнала запросов.
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['*']
+    import django
+    django.setup()
+
+
+def pick_urls(pages, requests, seed):
+    """Адреса для каждой страницы и пользователь для ленты подписок."""
+    from django.db.models import Count
+    from django.urls import reverse
+
+    from posts.models import Follow, Group, Post, UserStats
+
+    rng = random.Random(seed)
+    stars = list(UserStats.objects.order_by('-followers_count')
+                 .values_list('user__username', flat=True)[:100])
+    groups = list(Group.objects.annotate(total=Count('posts'))
+                  .order_by('-total').values_list('slug', flat=True)[:100])
+    last_post = Post.objects.order_by('-pk').values_list('pk', flat=True)
+    post_ids = list(last_post[:1000])
+    reader = (Follow.objects.values('user').annotate(total=Count('pk'))
+              .order_by('-total').values_list('user', flat=True).first())
+
+    def popular(items):
+        weights = [1 / rank for rank in range(1, len(items) + 1)]
+        return rng.choices(items, weights=weights, k=requests)
+
+    urls = {
+        'index': [reverse('posts:index')] * requests,
+        'group_list': [reverse('posts:group_list', args=[slug])
+                       for slug in popular(groups)] if groups else [],
+        'profile': [reverse('posts:profile', args=[name])
+                    for name in popular(stars)] if stars else [],
+        'post_detail': [reverse('posts:post_detail', args=[pk])
+                        for pk in popular(post_ids)] if post_ids else [],
+        'follow_index': [reverse('posts:follow_index')] * requests,
+    }
+    return {page: urls[page] for page in pages if urls[page]}, reader
+
+
+def session_cookie(user_id):
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    client = Client()
+    client.force_login(get_user_model().objects.get(pk=user_id))
+    return f'{settings.SESSION_COOKIE_NAME}=' + \
+        client.cookies[settings.SESSION_COOKIE_NAME].value
+
+
+class ThreadingServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def client_fetcher():
+    from django.db import connection
+    from django.test import Client
+
+    local = threading.local()
+
+    def fetch(url, cookie):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+            if cookie:
+                name, value = cookie.split('=', 1)
+                local.client.cookies[name] = value
+        try:
+            return local.client.get(url).status_code
+        except Exception:
+            # Тестовый клиент пробрасывает исключения view; для отчёта
+            # это такой же ответ 500, как у сервера.
+            return 500
+        finally:
+            connection.close_if_unusable_or_obsolete()
+
+    return fetch, lambda: None
+
+
+def server_fetcher():
+    from django.core.wsgi import get_wsgi_application
+
+    server = make_server('127.0.0.1', 0, get_wsgi_application(),
+                         server_class=ThreadingServer,
+                         handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    def fetch(url, cookie):
+        request = Request(base + url, headers={'Cookie': cookie or ''})
+        try:
+            with urlopen(request) as response:
+                response.read()
+                return response.status
+        except HTTPError as error:
+            return error.code
+
+    return fetch, server.shutdown
+
+
+def percentile(samples, value, digits=2):
+    """
+    ``value``-й процентиль отсортированных ``samples`` в миллисекундах:
+    ближайший элемент по рангу (``statistics.quantiles`` — лишь с 3.8).
+    """
+    index = round((len(samples) - 1) * value / 100)
+    return round(samples[index] * 1000, digits)
+
+
+def run_page(fetch, urls, cookie, concurrency):
+    from core import metrics
+
+    def timed(url):
+        start = time.perf_counter()
+        status = fetch(url, cookie)
+        return time.perf_counter() - start, status
+
+    metrics.registry.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(timed, urls))
+    elapsed = time.perf_counter() - started
+    latencies = [latency for latency, _ in results]
+    ordered = sorted(latencies)
+    queries = sum(
+        histograms['view_sql_queries'].sum
+        for histograms in metrics.registry.views.values()
+    )
+    return {
+        'requests': len(urls),
+        'errors': sum(status >= 400 for _, status in results),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'p50_ms': percentile(ordered, 50),
+        'p95_ms': percentile(ordered, 95),
+        'p99_ms': percentile(ordered, 99),
+        'queries_per_request': round(queries / len(urls), 2),
+        'throughput_rps': round(len(urls) / elapsed, 1),
+    }
+
+
+def compare(report, baseline):
+    for page, result in report['pages'].items():
+        old = baseline['pages'].get(page)
+        if not old:
+            continue
+        print(f'{page:14}' + ''.join(
+            f'  {key} {old[key]} -> {result[key]}'
+            for key in ('p50_ms', 'p95_ms', 'queries_per_request',
+                        'throughput_rps')
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--database', help='Файл SQLite с данными')
+    parser.add_argument('--load', action='store_true',
+                        help='Сначала создать схему и наполнить базу')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--follows', type=int, default=20)
+    parser.add_argument('--mode', choices=('client', 'server'),
+                        default='client')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--pages', nargs='+', choices=PAGES, default=PAGES)
+    parser.add_argument('--seed', type=int, default=13)
+    parser.add_argument('--output', help='Куда записать JSON-отчёт')
+    parser.add_argument('--compare', help='JSON-отчёт для сравнения')
+    args = parser.parse_args()
+
+    setup(args.database)
+    from django.core.cache import cache
+    from django.core.management import call_command
+
+    from posts import seeding
+
+    if args.load:
+        call_command('migrate', verbosity=0)
+        seeding.Dataset(
+            users=args.users, groups=args.groups, posts=args.posts,
+            comments=args.comments, follows=args.follows, seed=args.seed,
+        ).load(log=print)
+        seeding.finish(log=print)
+
+    urls, reader = pick_urls(args.pages, args.requests, args.seed)
+    cookie = session_cookie(reader) if reader else None
+    fetch, stop = (server_fetcher if args.mode == 'server'
+                   else client_fetcher)()
+    report = {
+        'meta': {
+            'mode': args.mode,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'seed': args.seed,
+            'python': platform.python_version(),
+        },
+        'pages': {},
+    }
+    try:
+        for page, page_urls in urls.items():
+            cache.clear()
+            result = run_page(
+                fetch, page_urls,
+                cookie if page == 'follow_index' else None,
+                args.concurrency,
+            )
+            report['pages'][page] = result
+            print(f'{page:14} p50={result["p50_ms"]}ms '
+                  f'p95={result["p95_ms"]}ms p99={result["p99_ms"]}ms '
+                  f'queries={result["queries_per_request"]} '
+                  f'rps={result["throughput_rps"]}')
+    finally:
+        stop()
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Настройка кеша из одной строки-адреса, например из переменной окружения.
+
+Поддерживаемые схемы:
+
+* ``locmem://[имя]`` — память процесса (по умолчанию);
+* ``stub://[имя]`` — общий на весь процесс стаб разделяемого кеша
+  со счётчиками попаданий, для тестов и бенчмарков;
+* ``file:///абсолютный/путь`` — файлы, общие для всех воркеров машины;
+* ``memcached://host:port[,host:port]`` — memcached (python-memcached);
+* ``redis://[:пароль@]host:port[/db]`` — Redis через django-redis.
+
+Параметры запроса ``timeout``, ``max_entries`` и ``cull_frequency``
+переходят в ``TIMEOUT`` и ``OPTIONS`` бэкенда.
+"""
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'stub': 'core.cache_backends.SharedStubCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+
+
+def cache_from_url(url, key_prefix='', version=1):
+    """Возвращает словарь для ``settings.CACHES`` по адресу кеша."""
+    parts = urlsplit(url)
+    if parts.scheme not in BACKENDS:
+        raise ImproperlyConfigured(f'Неизвестная схема кеша: {url!r}')
+    config = {
+        'BACKEND': BACKENDS[parts.scheme],
+        'KEY_PREFIX': key_prefix,
+        'VERSION': version,
+    }
+    if parts.scheme in ('locmem', 'stub'):
+        config['LOCATION'] = parts.netloc or parts.path.strip('/')
+    elif parts.scheme == 'file':
+        config['LOCATION'] = parts.path
+    elif parts.scheme == 'memcached':
+        config['LOCATION'] = parts.netloc.split(',')
+    else:
+        config['LOCATION'] = parts._replace(query='').geturl()
+
+    params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+    if 'timeout' in params:
+        timeout = params.pop('timeout')
+        config['TIMEOUT'] = None if timeout == 'none' else int(timeout)
+    options = {key.upper(): int(value) for key, value in params.items()}
+    if options:
+        config['OPTIONS'] = options
+    return config
@@ -0,0 +1,29 @@
+from django.core.cache.backends.locmem import LocMemCache
+
+_stats = {}
+
+
+class SharedStubCache(LocMemCache):
+    """
+    Стаб разделяемого кеша (memcached, Redis) внутри процесса.
+
+    Как и у ``LocMemCache``, экземпляры с одним ``LOCATION`` видят одни
+    и те же данные, как клиенты одного сервера. Дополнительно стаб
+    считает попадания и промахи ``get``, чтобы тесты и бенчмарки могли
+    мерить hit rate.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.stats = _stats.setdefault(name, {'hits': 0, 'misses': 0})
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self, version)
+        if value is self:
+            self.stats['misses'] += 1
+            return default
+        self.stats['hits'] += 1
+        return value
+
+    def reset_stats(self):
+        self.stats.update(hits=0, misses=0)
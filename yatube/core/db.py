@@ -0,0 +1,143 @@
+"""
+Соединения с базой и запись в SQLite.
+
+``apply_sqlite_pragmas`` выполняет ``settings.SQLITE_PRAGMAS`` на каждом
+новом соединении SQLite. ``journal_mode=wal`` даёт читателям работать,
+пока идёт запись, а ``busy_timeout`` заставляет занятую базу ждать, а не
+сразу отвечать ``database is locked``. С ``CONN_MAX_AGE`` соединение
+живёт между запросами, и прагмы выполняются один раз на соединение.
+
+Писатель в SQLite один на всю базу. Запись, которая не дождалась
+блокировки за ``busy_timeout``, ``write()`` повторяет целиком, в новой
+транзакции, с растущей паузой (``SQLITE_WRITE_RETRIES``,
+``SQLITE_WRITE_BACKOFF``). С ``SQLITE_WRITER = 'queue'`` записи процесса
+не спорят за блокировку вовсе: их выполняет один поток-писатель, пачками
+до ``SQLITE_WRITER_BATCH`` в одной транзакции.
+"""
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+BUSY_ERRORS = ('database is locked', 'database table is locked')
+
+_writer = None
+_lock = threading.Lock()
+
+
+@receiver(connection_created, dispatch_uid='core.apply_sqlite_pragmas')
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_busy(error):
+    return isinstance(error, OperationalError) and str(error).startswith(
+        BUSY_ERRORS
+    )
+
+
+def retry_on_busy(func, *args, **kwargs):
+    """
+    Выполняет ``func`` в транзакции; занятую базу ждёт и повторяет
+    транзакцию заново, остальные ошибки пробрасывает сразу.
+    """
+    retries = getattr(settings, 'SQLITE_WRITE_RETRIES', 5)
+    backoff = getattr(settings, 'SQLITE_WRITE_BACKOFF', 0.05)
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        except OperationalError as error:
+            if not is_busy(error) or attempt == retries:
+                raise
+        # Пауза растёт вдвое и немного разбросана, чтобы повторы
+        # нескольких писателей не сталкивались снова.
+        time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def _run_batch(jobs):
+    """
+    Каждая запись — в своей точке сохранения: её ошибка не откатывает
+    соседей. Занятая база откатывает всю пачку на повтор.
+    """
+    results = []
+    for job in jobs:
+        try:
+            with transaction.atomic():
+                results.append((True, job()))
+        except Exception as error:
+            if is_busy(error):
+                raise
+            results.append((False, error))
+    return results
+
+
+class Writer:
+    """Поток, который выполняет записи процесса по очереди, пачками."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(
+            target=self.run, name='yatube-writer', daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self.jobs.put((future, partial(func, *args, **kwargs)))
+        return future
+
+    def take_batch(self):
+        batch = [self.jobs.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        return [
+            (future, job) for future, job in batch
+            if future.set_running_or_notify_cancel()
+        ]
+
+    def run(self):
+        while True:
+            batch = self.take_batch()
+            try:
+                results = retry_on_busy(_run_batch, [job for _, job in batch])
+            except Exception as error:
+                results = [(False, error)] * len(batch)
+            # Ответы — только после коммита и его on_commit.
+            for (future, _), (ok, value) in zip(batch, results):
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+            close_old_connections()
+
+
+def get_writer():
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = Writer(getattr(settings, 'SQLITE_WRITER_BATCH', 50))
+    return _writer
+
+
+def write(func, *args, **kwargs):
+    """Выполняет запись ``func(*args, **kwargs)`` и возвращает результат."""
+    if getattr(settings, 'SQLITE_WRITER', 'direct') == 'queue':
+        return get_writer().submit(func, *args, **kwargs).result()
+    return retry_on_busy(func, *args, **kwargs)
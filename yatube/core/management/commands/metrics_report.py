@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+
+from core import metrics
+
+COLUMNS = {
+    'count': 'запросов',
+    'latency': 'ср. мс',
+    'p95': 'p95 мс',
+    'queries': 'SQL',
+    'sql': 'SQL мс',
+    'render': 'рендер мс',
+}
+
+
+def summary(histograms):
+    latency = histograms['view_latency_seconds']
+    count = latency.count or 1
+    return {
+        'count': latency.count,
+        'latency': latency.sum / count * 1000,
+        'p95': latency.quantile(0.95) * 1000,
+        'queries': histograms['view_sql_queries'].sum / count,
+        'sql': histograms['view_sql_seconds'].sum / count * 1000,
+        'render': histograms['view_render_seconds'].sum / count * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Выводит самые медленные view по накопленным метрикам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Сколько view вывести',
+        )
+        parser.add_argument(
+            '--sort', choices=COLUMNS, default='latency',
+            help='Колонка для сортировки (по убыванию)',
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='После вывода удалить накопленные метрики',
+        )
+
+    def handle(self, *args, **options):
+        rows = sorted(
+            (
+                (view, summary(histograms))
+                for view, histograms in metrics.collect().items()
+            ),
+            key=lambda row: row[1][options['sort']],
+            reverse=True,
+        )[:options['top']]
+        width = max([len(view) for view, _ in rows] + [len('view')])
+        self.stdout.write(
+            'view'.ljust(width)
+            + ''.join(title.rjust(11) for title in COLUMNS.values())
+        )
+        for view, values in rows:
+            self.stdout.write(view.ljust(width) + ''.join(
+                f'{values[column]:11.0f}' if column == 'count'
+                else f'{values[column]:11.1f}'
+                for column in COLUMNS
+            ))
+        if options['reset']:
+            metrics.clear()
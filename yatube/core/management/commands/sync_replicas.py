@@ -0,0 +1,47 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import routers
+
+
+def sync(alias):
+    """Копирует основную базу в реплику и отмечает время копии в кеше."""
+    started = time.time()
+    source = sqlite3.connect(
+        connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+    )
+    target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+    try:
+        # Копия — снимок основной базы не раньше started.
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    routers.mark_synced(alias, started)
+    return time.time() - started
+
+
+class Command(BaseCommand):
+    help = 'Обновляет реплики SQLite копией основной базы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=float,
+            help='Повторять каждые столько секунд, пока не остановят',
+        )
+
+    def handle(self, *args, **options):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('Реплики не настроены: задайте YATUBE_REPLICAS')
+        while True:
+            for alias in replicas:
+                seconds = sync(alias)
+                self.stdout.write(f'{alias}: {seconds * 1000:.0f} мс')
+            if not options['every']:
+                break
+            time.sleep(options['every'])
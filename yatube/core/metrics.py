@@ -0,0 +1,271 @@
+"""
+Метрики запросов по view: задержка, число и время SQL-запросов, время
+рендера шаблонов.
+
+``core.middleware.MetricsMiddleware`` складывает наблюдения в
+гистограммы процесса. Раз в ``METRICS_FLUSH_INTERVAL`` секунд процесс
+сбрасывает свой снимок в ``METRICS_DIR/<pid>.json``: у каждого воркера
+свой файл, а ``/metrics`` и команда ``metrics_report`` суммируют файлы
+живых процессов.
+Так метрики видны и при нескольких воркерах, без общего сервера.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = getattr(settings, 'METRICS_DIR', os.path.join(
+    tempfile.gettempdir(), 'yatube-metrics'
+))
+FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 10)
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERIES = (1, 2, 5, 10, 20, 50, 100)
+
+# Имя метрики: границы корзин и описание для /metrics.
+METRICS = {
+    'view_latency_seconds': (SECONDS, 'Время ответа view'),
+    'view_sql_queries': (QUERIES, 'Число SQL-запросов за запрос'),
+    'view_sql_seconds': (SECONDS, 'Время SQL-запросов за запрос'),
+    'view_render_seconds': (SECONDS, 'Время рендера шаблонов за запрос'),
+}
+PREFIX = 'yatube_'
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами, как в Prometheus."""
+
+    def __init__(self, buckets, counts=None, total=0, count=0):
+        self.buckets = buckets
+        self.counts = counts or [0] * (len(buckets) + 1)
+        self.sum = total
+        self.count = count
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """Оценка квантиля сверху: граница корзины, где он лежит."""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        return {'counts': self.counts, 'sum': self.sum, 'count': self.count}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(self._new_view)
+        self.flushed_at = time.monotonic()
+
+    @staticmethod
+    def _new_view():
+        return {name: Histogram(buckets)
+                for name, (buckets, _) in METRICS.items()}
+
+    def observe(self, view, **values):
+        with self.lock:
+            histograms = self.views[view]
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                view: {name: histogram.to_dict()
+                       for name, histogram in histograms.items()}
+                for view, histograms in self.views.items()
+            }
+
+    def flush(self, force=False):
+        """Сбрасывает снимок в файл процесса не чаще ``FLUSH_INTERVAL``."""
+        now = time.monotonic()
+        if not force and now - self.flushed_at < FLUSH_INTERVAL:
+            return
+        self.flushed_at = now
+        path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=METRICS_DIR, suffix='.tmp')
+            with os.fdopen(fd, 'w') as file:
+                json.dump(self.snapshot(), file)
+            os.replace(temp, path)
+        except OSError:
+            # Метрики не должны ронять запрос.
+            logger.exception('Не удалось сохранить метрики в %s', path)
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+registry = Registry()
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def other_snapshots():
+    """
+    Снимки других живых процессов. Снимки умерших удаляются: иначе они
+    суммировались бы вечно, а процесс, получивший тот же pid,
+    перезаписал бы чужой файл.
+    """
+    if not os.path.isdir(METRICS_DIR):
+        return
+    own = os.getpid()
+    for name in os.listdir(METRICS_DIR):
+        pid = name[:-len('.json')]
+        if not name.endswith('.json') or not pid.isdigit():
+            continue
+        if int(pid) == own:
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        try:
+            if not is_alive(int(pid)):
+                os.remove(path)
+                continue
+            with open(path) as file:
+                yield json.load(file)
+        except (OSError, ValueError):
+            continue
+
+
+def collect():
+    """
+    Сумма снимков живых процессов. Свой процесс берётся из памяти, а не
+    из файла, чтобы последние запросы были видны сразу.
+    """
+    snapshots = [registry.snapshot(), *other_snapshots()]
+    views = defaultdict(Registry._new_view)
+    for snapshot in snapshots:
+        for view, histograms in snapshot.items():
+            for name, data in histograms.items():
+                if name not in METRICS:
+                    continue
+                views[view][name].merge(Histogram(
+                    METRICS[name][0], data['counts'],
+                    data['sum'], data['count'],
+                ))
+    return dict(views)
+
+
+def clear():
+    """Удаляет накопленные метрики всех процессов."""
+    registry.reset()
+    if os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if name.endswith('.json'):
+                os.remove(os.path.join(METRICS_DIR, name))
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def exposition(views):
+    """Текстовый формат Prometheus."""
+    lines = []
+    for name, (buckets, help_text) in METRICS.items():
+        metric = PREFIX + name
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for view in sorted(views):
+            histogram = views[view][name]
+            label = 'view="{}"'.format(
+                view.replace('\\', '\\\\').replace('"', '\\"')
+            )
+            seen = 0
+            for bound, count in zip(
+                (*buckets, float('inf')), histogram.counts
+            ):
+                seen += count
+                lines.append(
+                    f'{metric}_bucket{{{label},le="{_format_bound(bound)}"}}'
+                    f' {seen}'
+                )
+            lines.append(f'{metric}_sum{{{label}}} {histogram.sum!r}')
+            lines.append(f'{metric}_count{{{label}}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    """Счётчики одного запроса; SQL-обёртка и рендер пишут сюда."""
+
+    def __init__(self):
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.render_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - start
+            self.sql_queries += 1
+
+
+current = ContextVar('request_metrics', default=None)
+
+
+def instrument_templates():
+    """
+    Оборачивает ``Template.render`` движка Django. Время считается
+    только для внешнего шаблона: вложенные ``{% include %}`` уже в него
+    входят.
+    """
+    from django.template.base import Template
+    if getattr(Template.render, 'instrumented', False):
+        return
+    render = Template.render
+
+    @wraps(render)
+    def timed_render(self, context):
+        metrics = current.get()
+        if metrics is None:
+            return render(self, context)
+        metrics.render_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            metrics.render_depth -= 1
+            if not metrics.render_depth:
+                metrics.render_seconds += time.perf_counter() - start
+
+    timed_render.instrumented = True
+    Template.render = timed_render
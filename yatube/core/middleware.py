@@ -0,0 +1,196 @@
+import gzip
+import time
+import zlib
+from contextlib import ExitStack
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+
+from core import metrics, routers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class MetricsMiddleware:
+    """
+    Записывает для каждого запроса задержку, число и время SQL-запросов
+    и время рендера шаблонов в гистограммы его view (см. core/metrics.py).
+    Работает и без DEBUG: SQL считается обёрткой ``execute_wrapper``, а
+    не журналом запросов отладки.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.instrument_templates()
+
+    def __call__(self, request):
+        record = metrics.RequestMetrics()
+        start = time.perf_counter()
+        response = self.measure(record, self.get_response, request)
+        if response.streaming:
+            response.streaming_content = self.measure_stream(
+                request, record, start, response.streaming_content
+            )
+        else:
+            self.observe(request, record, start)
+        return response
+
+    @staticmethod
+    def measure(record, func, *args):
+        """Вызывает ``func``, записывая её SQL и рендер в ``record``."""
+        token = metrics.current.set(record)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(record.execute)
+                    )
+                return func(*args)
+        finally:
+            metrics.current.reset(token)
+
+    def measure_stream(self, request, record, start, chunks):
+        """
+        Куски потокового ответа рендерятся уже после view, когда сервер
+        отдаёт тело: их SQL и рендер тоже входят в запрос, а задержка
+        считается до конца тела.
+        """
+        chunks = iter(chunks)
+        try:
+            while True:
+                try:
+                    chunk = self.measure(record, next, chunks)
+                except StopIteration:
+                    return
+                yield chunk
+        finally:
+            self.observe(request, record, start)
+
+    @staticmethod
+    def observe(request, record, start):
+        match = request.resolver_match
+        metrics.registry.observe(
+            match.view_name if match else '<unresolved>',
+            view_latency_seconds=time.perf_counter() - start,
+            view_sql_queries=record.sql_queries,
+            view_sql_seconds=record.sql_seconds,
+            view_render_seconds=record.render_seconds,
+        )
+        metrics.registry.flush()
+
+
+def gzip_bytes(data, level):
+    """
+    ``gzip.compress`` с нулевым временем в заголовке: одинаковые данные
+    сжимаются в одинаковые байты. Через ``GzipFile``, потому что
+    ``gzip.compress`` принимает ``mtime`` только с Python 3.8.
+    """
+    buffer = BytesIO()
+    with gzip.GzipFile(mode='wb', fileobj=buffer, compresslevel=level,
+                       mtime=0) as file:
+        file.write(data)
+    return buffer.getvalue()
+
+
+def gzip_stream(chunks):
+    """
+    Сжимает поток по кускам. После каждого куска — sync flush, чтобы
+    уже готовая часть страницы уходила клиенту, а не ждала в буфере.
+    """
+    buffer = BytesIO()
+    with gzip.GzipFile(mode='wb', fileobj=buffer, mtime=0) as file:
+        for chunk in chunks:
+            file.write(chunk)
+            file.flush(zlib.Z_SYNC_FLUSH)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def brotli_stream(chunks):
+    compressor = brotli.Compressor()
+    for chunk in chunks:
+        yield compressor.process(chunk) + compressor.flush()
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы в br (если установлен пакет ``brotli``) или gzip, смотря
+    по ``Accept-Encoding``. Ответы короче ``COMPRESSION_MIN_SIZE`` байт и
+    уже сжатые отдаются как есть; потоковые сжимаются по кускам.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 512)
+
+    def encoding(self, request):
+        accepted = {
+            part.split(';')[0].strip()
+            for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+        }
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+        patch_vary_headers(response, ['Accept-Encoding'])
+        encoding = self.encoding(request)
+        if encoding is None:
+            return response
+        if response.streaming:
+            stream = brotli_stream if encoding == 'br' else gzip_stream
+            response.streaming_content = stream(response.streaming_content)
+            del response['Content-Length']
+        else:
+            if encoding == 'br':
+                content = brotli.compress(response.content)
+            else:
+                content = gzip_bytes(response.content, 6)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+        # Сжатое тело — другие байты: ETag становится слабым (RFC 7232).
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+
+class PrimaryPinMiddleware:
+    """
+    После запроса, который мог писать в базу, посетитель
+    ``REPLICA_PIN_SECONDS`` секунд читает ленты из основной базы (см.
+    core/routers.py), а реплики отсчитывают отставание от этой записи.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            return response
+        if getattr(settings, 'DATABASE_REPLICAS', []):
+            routers.mark_written()
+            response.set_cookie(
+                routers.PIN_COOKIE, '1', httponly=True, samesite='Lax',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+            )
+        return response
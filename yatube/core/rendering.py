@@ -0,0 +1,41 @@
+"""
+Рендер страниц с «тяжёлыми» слотами и потоковый режим.
+
+View отдаёт в ``render_page`` обычный контекст и словарь слотов: имя
+переменной шаблона — функция, которая выдаёт куски HTML (и делает для
+них запросы к базе). Без ``STREAMING_RENDER`` слоты просто склеиваются
+в строки контекста и страница рендерится как обычно. С ним шаблон
+рендерится с метками на месте слотов, и ответ идёт потоком: всё до
+первой метки уходит сразу, а слоты считаются и рендерятся, пока
+клиент уже грузит стили и начало страницы.
+"""
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.shortcuts import render
+from django.template import loader
+from django.utils.safestring import mark_safe
+
+MARKER = '<!--yatube-slot:{}-->'
+
+
+def render_page(request, template_name, context, slots, status=None):
+    if not getattr(settings, 'STREAMING_RENDER', False):
+        for name, chunks in slots.items():
+            context[name] = mark_safe(''.join(chunks()))
+        return render(request, template_name, context, status=status)
+    for name in slots:
+        context[name] = mark_safe(MARKER.format(name))
+    page = loader.render_to_string(template_name, context, request)
+    return StreamingHttpResponse(
+        _stream(page, slots), status=status,
+        content_type='text/html; charset=utf-8',
+    )
+
+
+def _stream(page, slots):
+    for name, chunks in slots.items():
+        head, marker, page = page.partition(MARKER.format(name))
+        yield head
+        if marker:
+            yield from chunks()
+    yield page
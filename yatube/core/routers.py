@@ -0,0 +1,130 @@
+"""
+Чтение лент с реплик базы.
+
+View лент, обёрнутые в ``read_from_replica``, читают модели ``posts``
+из случайной реплики из ``DATABASE_REPLICAS``; всё остальное и любые
+записи идут в ``default``. Реплика — копия основной базы, которую обновляет
+``manage.py sync_replicas``, и она отстаёт от неё:
+
+* после запроса, который мог писать (не GET/HEAD/OPTIONS),
+  ``PrimaryPinMiddleware`` ставит посетителю куку, и ``REPLICA_PIN_SECONDS``
+  секунд он читает из ``default`` — видит свой пост и комментарий сразу;
+* реплика, в которой нет последней записи и которую не обновляли
+  дольше ``REPLICA_MAX_LAG`` секунд, не используется, пока её не
+  обновят; если отстали все, ленты читаются из ``default``;
+* страницы лент и карточки, прочитанные из реплики, кешируются не
+  дольше ``REPLICA_MAX_LAG`` секунд и под своими ключами для каждой
+  копии реплики.
+
+Время последней записи и обновления реплик хранится в кеше, поэтому
+между воркерами оно общее только с общим кешем.
+"""
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'yatube_primary'
+WRITTEN_KEY = 'db:written_at'
+REPLICA_APPS = {'posts'}
+
+current = ContextVar('replica', default=None)
+
+
+def synced_key(alias):
+    return f'db:synced_at:{alias}'
+
+
+def mark_written():
+    cache.set(WRITTEN_KEY, time.time(), None)
+
+
+def mark_synced(alias, synced_at):
+    cache.set(synced_key(alias), synced_at, None)
+
+
+def fresh_replicas():
+    """
+    Реплики, в которых есть все записи, или обновлённые не раньше чем
+    ``REPLICA_MAX_LAG`` секунд назад: старше этого они не отдают.
+    Реплика, время обновления которой неизвестно (его ещё не было или
+    кеш его потерял), считается отставшей.
+    """
+    replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+    if not replicas:
+        return []
+    values = cache.get_many([WRITTEN_KEY, *map(synced_key, replicas)])
+    written = values.get(WRITTEN_KEY, float('-inf'))
+    oldest = time.time() - getattr(settings, 'REPLICA_MAX_LAG', 10)
+    fresh = []
+    for alias in replicas:
+        synced = values.get(synced_key(alias))
+        if synced is not None and (synced >= written or synced >= oldest):
+            fresh.append(alias)
+    return fresh
+
+
+def cache_timeout(timeout):
+    """
+    Что прочитано из реплики, кешируется не дольше ``REPLICA_MAX_LAG``:
+    иначе старые данные пережили бы обновление реплики под новой версией.
+    """
+    if current.get() is None:
+        return timeout
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG', 10)
+    return max_lag if timeout is None else min(timeout, max_lag)
+
+
+def cache_namespace():
+    """
+    Часть ключа кеша для прочитанного из реплики: её имя и время копии.
+    Версии лент растут при записи, а реплика может её ещё не содержать —
+    без этой части её старые данные легли бы под новой версией и
+    достались бы и тем, кто читает из основной базы.
+    """
+    alias = current.get()
+    if alias is None:
+        return None
+    return f'{alias}@{cache.get(synced_key(alias))}'
+
+
+def choose_replica(request):
+    if PIN_COOKIE in request.COOKIES:
+        return None
+    replicas = fresh_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+def read_from_replica(view):
+    """Все чтения view (и её шаблона) — из одной реплики."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = current.set(choose_replica(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            current.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Сессии и пользователи — всегда из основной базы: выход из
+        # аккаунта не должен «отставать» вместе с репликой.
+        if model._meta.app_label not in REPLICA_APPS:
+            return None
+        return current.get()
+
+    def db_for_write(self, model, **hints):
+        # Иначе объект, прочитанный из реплики, сохранился бы в неё же.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
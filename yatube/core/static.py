@@ -0,0 +1,122 @@
+"""
+Сборка и раздача статики.
+
+``collectstatic`` с ``CompressedManifestStaticFilesStorage`` кладёт в
+``STATIC_ROOT`` копии файлов с хешем содержимого в имени
+(``css/bootstrap.min.3f2c….css``) и рядом сжатые ``.gz`` и, если
+установлен пакет ``brotli``, ``.br``. ``{% static %}`` ссылается на
+хешированные имена из манифеста, поэтому их можно кешировать навсегда.
+
+``StaticFilesMiddleware`` — WSGI-обёртка, которая отдаёт эти файлы без
+Django: выбирает сжатую копию по ``Accept-Encoding`` и ставит
+хешированным файлам ``Cache-Control: immutable`` на год.
+"""
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+from core.middleware import gzip_bytes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (
+    '.css', '.js', '.svg', '.json', '.txt', '.xml', '.map', '.ico', '.html',
+)
+# Сжатая копия, которая экономит меньше 5%, не стоит отдельного файла.
+MIN_RATIO = 0.95
+IMMUTABLE = 'public, max-age=31536000, immutable'
+SHORT = 'public, max-age=60'
+HASHED = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress(path):
+    """Пишет рядом с файлом ``.gz`` и ``.br``; возвращает их пути."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    copies = [(path + '.gz', gzip_bytes(data, 9))]
+    if brotli is not None:
+        copies.append((path + '.br', brotli.compress(data)))
+    written = []
+    for copy_path, compressed in copies:
+        if len(compressed) >= len(data) * MIN_RATIO:
+            continue
+        with open(copy_path, 'wb') as file:
+            file.write(compressed)
+        written.append(copy_path)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Манифест с хешами плюс сжатые копии хешированных файлов."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                compress(self.path(name))
+
+
+class StaticFilesMiddleware:
+    """
+    WSGI-приложение: ``STATIC_URL`` из ``STATIC_ROOT``, всё остальное —
+    в ``application``.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = os.path.realpath(root or settings.STATIC_ROOT)
+        self.prefix = prefix or settings.STATIC_URL
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if (not path.startswith(self.prefix)
+                or environ['REQUEST_METHOD'] not in ('GET', 'HEAD')):
+            return self.application(environ, start_response)
+        name = os.path.realpath(
+            os.path.join(self.root, path[len(self.prefix):])
+        )
+        if not name.startswith(self.root + os.sep) or not os.path.isfile(name):
+            return self.application(environ, start_response)
+        return self.serve(environ, start_response, name)
+
+    def serve(self, environ, start_response, name):
+        content_type, _ = mimetypes.guess_type(name)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type.endswith('script'):
+            content_type += '; charset=utf-8'
+        headers = [
+            ('Content-Type', content_type),
+            ('Cache-Control', IMMUTABLE if HASHED.search(name) else SHORT),
+        ]
+        if name.endswith(COMPRESSIBLE):
+            headers.append(('Vary', 'Accept-Encoding'))
+            accepted = {
+                part.split(';')[0].strip()
+                for part in environ.get('HTTP_ACCEPT_ENCODING', '').split(',')
+            }
+            for encoding, suffix in ENCODINGS:
+                if encoding in accepted and os.path.isfile(name + suffix):
+                    name += suffix
+                    headers.append(('Content-Encoding', encoding))
+                    break
+        stat = os.stat(name)
+        headers += [
+            ('Content-Length', str(stat.st_size)),
+            ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+        ]
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return [b'']
+        wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return wrapper(open(name, 'rb'))
@@ -0,0 +1,460 @@
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import db, metrics, routers
+from core.cache import cache_from_url
+from core.middleware import CompressionMiddleware
+from core.static import StaticFilesMiddleware
+from posts.models import Post
+
+User = get_user_model()
+
+
+class CacheFromUrlTest(SimpleTestCase):
+    def test_backends_by_scheme(self):
+        """Схема адреса выбирает бэкенд и LOCATION."""
+        cases = {
+            'locmem://': (
+                'django.core.cache.backends.locmem.LocMemCache', ''
+            ),
+            'file:///var/tmp/yatube': (
+                'django.core.cache.backends.filebased.FileBasedCache',
+                '/var/tmp/yatube',
+            ),
+            'memcached://10.0.0.1:11211,10.0.0.2:11211': (
+                'django.core.cache.backends.memcached.MemcachedCache',
+                ['10.0.0.1:11211', '10.0.0.2:11211'],
+            ),
+            'redis://:secret@localhost:6379/1?timeout=60': (
+                'django_redis.cache.RedisCache',
+                'redis://:secret@localhost:6379/1',
+            ),
+        }
+        for url, (backend, location) in cases.items():
+            with self.subTest(url=url):
+                config = cache_from_url(url)
+                self.assertEqual(config['BACKEND'], backend)
+                self.assertEqual(config['LOCATION'], location)
+
+    def test_prefix_version_and_options(self):
+        """Префикс, версия и параметры запроса попадают в настройки."""
+        config = cache_from_url(
+            'locmem://feeds?timeout=none&max_entries=5000',
+            key_prefix='yatube', version=3,
+        )
+        self.assertEqual(config['KEY_PREFIX'], 'yatube')
+        self.assertEqual(config['VERSION'], 3)
+        self.assertEqual(config['LOCATION'], 'feeds')
+        self.assertIsNone(config['TIMEOUT'])
+        self.assertEqual(config['OPTIONS'], {'MAX_ENTRIES': 5000})
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ImproperlyConfigured):
+            cache_from_url('mongodb://localhost')
+
+    @override_settings(CACHES={
+        'one': cache_from_url('stub://shared'),
+        'two': cache_from_url('stub://shared'),
+    })
+    def test_stub_is_shared_between_clients(self):
+        """Два клиента стаба видят общие данные и общие счётчики."""
+        one, two = caches['one'], caches['two']
+        one.reset_stats()
+        one.set('key', 'value')
+        self.assertEqual(two.get('key'), 'value')
+        self.assertIsNone(two.get('missing'))
+        self.assertEqual(one.stats, {'hits': 1, 'misses': 1})
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        patcher = mock.patch.object(metrics, 'METRICS_DIR', directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        metrics.clear()
+        cache.clear()
+
+    def test_view_is_measured(self):
+        """По view копятся задержка, SQL-запросы и время рендера."""
+        self.client.get(reverse('posts:index'))
+        histograms = metrics.collect()['posts:index']
+        self.assertEqual(histograms['view_latency_seconds'].count, 1)
+        self.assertGreater(histograms['view_sql_queries'].sum, 0)
+        self.assertGreater(histograms['view_render_seconds'].sum, 0)
+        self.assertLessEqual(
+            histograms['view_render_seconds'].sum,
+            histograms['view_latency_seconds'].sum,
+        )
+
+    @override_settings(STREAMING_RENDER=True)
+    def test_streamed_body_is_measured(self):
+        """SQL потоковой страницы, выполненный при отдаче тела, учтён."""
+        user = User.objects.create_user(username='NoName')
+        post = Post.objects.create(text='Тестовый текст', author=user)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            self.assertFalse(metrics.collect())
+            b''.join(response.streaming_content)
+        histograms = metrics.collect()['posts:post_detail']
+        self.assertEqual(histograms['view_latency_seconds'].count, 1)
+        self.assertEqual(histograms['view_sql_queries'].sum,
+                         len(queries))
+
+    def test_other_processes_are_summed(self):
+        """Снимки других воркеров складываются с метриками процесса."""
+        self.client.get(reverse('posts:index'))
+        metrics.registry.flush(force=True)
+        with open(os.path.join(metrics.METRICS_DIR, '1.json'), 'w') as file:
+            json.dump(metrics.registry.snapshot(), file)
+        histograms = metrics.collect()['posts:index']
+        self.assertEqual(histograms['view_latency_seconds'].count, 2)
+
+    def test_dead_processes_are_pruned(self):
+        """Снимок умершего процесса удаляется и не суммируется."""
+        self.client.get(reverse('posts:index'))
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        path = os.path.join(metrics.METRICS_DIR, f'{process.pid}.json')
+        with open(path, 'w') as file:
+            json.dump(metrics.registry.snapshot(), file)
+        histograms = metrics.collect()['posts:index']
+        self.assertEqual(histograms['view_latency_seconds'].count, 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_endpoint(self):
+        """/metrics отдаёт формат Prometheus и закрыт для чужих адресов."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response, 'yatube_view_latency_seconds_count{view="posts:index"} 1'
+        )
+        self.assertContains(
+            response,
+            'yatube_view_sql_queries_bucket{view="posts:index",le="+Inf"} 1',
+        )
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_report_command(self):
+        """Команда выводит самые медленные view."""
+        self.client.get(reverse('posts:index'))
+        output = StringIO()
+        call_command('metrics_report', '--top', '1', stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('posts:index', lines[1])
+
+
+class StaticFilesTest(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        storage = 'core.static.CompressedManifestStaticFilesStorage'
+        with override_settings(
+            STATIC_ROOT=self.root, STATICFILES_STORAGE=storage
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            self.css = staticfiles_storage.stored_name(
+                'css/bootstrap.min.css'
+            )
+        self.app = StaticFilesMiddleware(
+            self.fallback, root=self.root, prefix='/static/'
+        )
+
+    @staticmethod
+    def fallback(environ, start_response):
+        start_response('404 Not Found', [])
+        return [b'django']
+
+    def get(self, path, **environ):
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = status
+            response['headers'] = dict(headers)
+
+        body = b''.join(self.app(
+            {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', **environ},
+            start_response,
+        ))
+        return response['status'], response['headers'], body
+
+    def test_collectstatic_hashes_and_compresses(self):
+        """Имена с хешем содержимого и сжатая копия рядом."""
+        self.assertRegex(self.css, r'^css/bootstrap\.min\.[0-9a-f]{12}\.css$')
+        path = os.path.join(self.root, self.css)
+        with open(path, 'rb') as original, \
+                gzip.open(path + '.gz') as compressed:
+            self.assertEqual(compressed.read(), original.read())
+
+    def test_hashed_files_are_immutable(self):
+        """Хешированный файл кешируется навсегда, gzip по запросу."""
+        status, headers, body = self.get(
+            '/static/' + self.css, HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        self.assertEqual(status, '200 OK')
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(headers['Content-Length']), len(body))
+        status, headers, _ = self.get('/static/css/bootstrap.min.css')
+        self.assertNotIn('immutable', headers['Cache-Control'])
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_other_paths_go_to_django(self):
+        """Чужие адреса и выход за STATIC_ROOT отдаются приложению."""
+        for path in ('/', '/static/../../etc/passwd', '/static/nope.css'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path)[2], b'django')
+
+
+class CompressionMiddlewareTest(SimpleTestCase):
+    def respond(self, response, encoding='gzip, deflate'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_large_response_is_gzipped(self):
+        """Длинный ответ сжимается, ETag становится слабым."""
+        response = HttpResponse('Ятуб ' * 500)
+        response['ETag'] = '"abc"'
+        response = self.respond(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(
+            gzip.decompress(response.content).decode(), 'Ятуб ' * 500
+        )
+
+    def test_short_or_unaccepted_response_is_kept(self):
+        """Короткий ответ и клиент без gzip получают тело как есть."""
+        response = self.respond(HttpResponse('коротко'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.respond(HttpResponse('Ятуб ' * 500), encoding='')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_stream_is_flushed_per_chunk(self):
+        """Каждый кусок потока распаковывается сразу, без конца потока."""
+        response = self.respond(
+            StreamingHttpResponse(iter([b'<head>', b'<body>']))
+        )
+        chunks = iter(response.streaming_content)
+        decompressor = zlib.decompressobj(wbits=31)
+        received = b''
+        while b'<head>' not in received:
+            received += decompressor.decompress(next(chunks))
+        self.assertEqual(received, b'<head>')
+        received += decompressor.decompress(b''.join(chunks))
+        self.assertEqual(received, b'<head><body>')
+
+
+class SqlitePragmasTest(SimpleTestCase):
+    def test_pragmas_run_on_connect(self):
+        """Новое соединение переходит в WAL и ждёт занятую базу."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_dict = dict(
+            connections['default'].settings_dict,
+            NAME=os.path.join(directory, 'db.sqlite3'),
+        )
+        wrapper = DatabaseWrapper(settings_dict, alias='pragmas')
+        pragmas = {'journal_mode': 'wal', 'busy_timeout': 2500}
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 2500)
+
+
+@override_settings(SQLITE_WRITE_BACKOFF=0)
+class WriteTest(TransactionTestCase):
+    def test_busy_write_is_retried(self):
+        """Занятая база — повтор транзакции, прочие ошибки — сразу."""
+        busy = OperationalError('database is locked')
+        func = mock.Mock(side_effect=[busy, busy, 'записано'])
+        self.assertEqual(db.write(func, 1, text='x'), 'записано')
+        self.assertEqual(func.call_count, 3)
+        func.assert_called_with(1, text='x')
+
+        func = mock.Mock(side_effect=OperationalError('no such table: x'))
+        with self.assertRaises(OperationalError):
+            db.write(func)
+        self.assertEqual(func.call_count, 1)
+
+        func = mock.Mock(side_effect=busy)
+        with override_settings(SQLITE_WRITE_RETRIES=2):
+            with self.assertRaises(OperationalError):
+                db.write(func)
+        self.assertEqual(func.call_count, 3)
+
+    def test_writer_isolates_failed_jobs(self):
+        """Ошибка одной записи пачки не откатывает соседние."""
+        error = ValueError('плохо')
+        results = db._run_batch([mock.Mock(side_effect=error), lambda: 1])
+        self.assertEqual(results, [(False, error), (True, 1)])
+
+        writer = db.Writer(batch_size=10)
+        failed = writer.submit(mock.Mock(side_effect=error))
+        done = writer.submit(lambda: 'записано')
+        self.assertEqual(done.result(timeout=5), 'записано')
+        with self.assertRaises(ValueError):
+            failed.result(timeout=5)
+
+
+def add_database(alias, name):
+    connections.databases[alias] = dict(
+        connections.databases['default'], NAME=name, TEST={},
+    )
+
+
+def remove_database(alias):
+    connections[alias].close()
+    del connections[alias]
+    del connections.databases[alias]
+
+
+class ReplicaTest(TestCase):
+    """Реплика — копия тестовой базы из sync_replicas в отдельном файле."""
+
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        add_database('replica', os.path.join(cls.directory, 'replica.db'))
+        with override_settings(DATABASE_REPLICAS=['replica']):
+            call_command('sync_replicas', stdout=StringIO())
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        remove_database('replica')
+        shutil.rmtree(cls.directory)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        routers.mark_synced('replica', time.time())
+        self.client.force_login(self.user)
+
+    def posts_queries(self, alias, url):
+        with CaptureQueriesContext(connections[alias]) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [
+            query['sql'] for query in queries
+            if 'FROM "posts_post"' in query['sql']
+        ]
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_feeds_read_from_replica(self):
+        """Ленты читают посты из реплики, сессию — из основной базы."""
+        for url in (reverse('posts:index'), reverse('api:posts'),
+                    reverse('posts:follow_index')):
+            with self.subTest(url=url):
+                cache.clear()
+                routers.mark_synced('replica', time.time())
+                with CaptureQueriesContext(connections['replica']) as queries:
+                    self.client.get(url)
+                self.assertTrue(queries.captured_queries)
+                self.assertFalse(any(
+                    'django_session' in query['sql'] for query in queries
+                ))
+        self.assertFalse(self.posts_queries(
+            'replica', reverse('posts:post_detail', args=[self.post.pk])
+        ))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_writer_is_pinned_to_primary(self):
+        """После записи посетитель читает свою запись из основной базы."""
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'},
+        )
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertFalse(self.posts_queries('replica', reverse('posts:index')))
+        self.assertTrue(self.posts_queries('default', reverse('posts:index')))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_replica_reads_do_not_shadow_primary(self):
+        """Лента из реплики, закешированная после записи, не прячет её."""
+        response = self.client.post(reverse('posts:post_create'),
+                                    {'text': 'Новый пост'})
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        post = Post.objects.latest('pk')
+        reader = self.client_class()
+        reader.get(reverse('posts:index'))
+        page = self.client.get(reverse('posts:index')).context['page_obj']
+        self.assertIn(post, list(page))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_profile_of_user_missing_from_replica(self):
+        """Недостающие в реплике счётчики читаются из основной базы."""
+        User.objects.create_user(username='newcomer')
+        response = self.client.get(
+            reverse('posts:profile', args=['newcomer'])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['stats'].posts_count, 0)
+
+    @override_settings(DATABASE_REPLICAS=['replica'], REPLICA_MAX_LAG=10)
+    def test_lagging_replica_is_skipped(self):
+        """Реплика без последней записи и старше REPLICA_MAX_LAG — мимо."""
+        routers.mark_written()
+        routers.mark_synced('replica', time.time() - 60)
+        self.assertEqual(routers.fresh_replicas(), [])
+        self.assertFalse(self.posts_queries('replica', reverse('posts:index')))
+        routers.mark_synced('replica', time.time() - 5)
+        self.assertEqual(routers.fresh_replicas(), ['replica'])
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_unknown_sync_time_is_stale(self):
+        """Без времени обновления в кеше реплика не используется."""
+        cache.clear()
+        self.assertEqual(routers.fresh_replicas(), [])
+        self.assertFalse(self.posts_queries('replica', reverse('posts:index')))
+        self.assertTrue(self.posts_queries('default', reverse('posts:index')))
+
+    @override_settings(REPLICA_MAX_LAG=10)
+    def test_replica_reads_are_cached_briefly(self):
+        """Прочитанное из реплики кешируется не дольше REPLICA_MAX_LAG."""
+        self.assertIsNone(routers.cache_timeout(None))
+        token = routers.current.set('replica')
+        self.addCleanup(routers.current.reset, token)
+        self.assertEqual(routers.cache_timeout(None), 10)
+        self.assertEqual(routers.cache_timeout(900), 10)
+        self.assertEqual(routers.cache_timeout(5), 5)
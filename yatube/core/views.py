@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from core import metrics
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -17,3 +21,14 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics_export(request):
+    """Метрики view в текстовом формате Prometheus."""
+    allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_staff):
+        raise Http404
+    return HttpResponse(
+        metrics.exposition(metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Group, Post
 
 
@@ -16,6 +17,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу, а не LIKE по всей таблице."""
+        if not search_term:
+            return queryset, False
+        post_ids = [
+            hit.object_id for hit in search.search(search_term)
+            if hit.kind == 'post'
+        ]
+        return queryset.filter(pk__in=post_ids), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
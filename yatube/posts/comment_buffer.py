@@ -0,0 +1,238 @@
+"""
+Буферизованный приём комментариев.
+
+С ``COMMENT_BUFFER = True`` ``add_comment`` проверяет форму и пост сразу,
+но комментарий не сохраняет: дописывает его строкой JSON в файл-очередь
+процесса в ``COMMENT_BUFFER_DIR`` и отвечает. Фоновый поток раз в
+``COMMENT_BUFFER_INTERVAL`` секунд забирает накопленное и пишет его
+одной транзакцией, ``bulk_create`` пачками до ``COMMENT_BUFFER_BATCH``
+строк. Счётчики авторов, версии карточек, поисковый индекс и счета
+популярного обновляются раз на пачку.
+Время комментария — время записи пачки.
+
+Очередь — файл, а не память: файл пачки удаляется только после коммита,
+поэтому принятый комментарий переживает падение процесса и будет записан
+позже — любым процессом, который найдёт файлы умершего, или
+``manage.py flush_comments``. Упасть между коммитом и удалением файла —
+значит записать пачку ещё раз: гарантия «хотя бы один раз». Файл не
+синхронизируется на диск после каждой строки, поэтому от выключения
+питания он не спасает.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, close_old_connections
+
+from core.db import write
+from core.metrics import is_alive
+
+from . import feed_cache, search, trending
+from .models import Comment, Post, UserStats
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+_buffer = None
+_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'COMMENT_BUFFER', False)
+
+
+def save_comments(records):
+    """Пишет пачку одним INSERT; комментарии к удалённым постам — мимо."""
+    post_ids = set(Post.objects.filter(
+        pk__in={record['post_id'] for record in records}
+    ).values_list('pk', flat=True))
+    author_ids = set(User.objects.filter(
+        pk__in={record['author_id'] for record in records}
+    ).values_list('pk', flat=True))
+    comments = [
+        Comment(post_id=record['post_id'], author_id=record['author_id'],
+                text=record['text'])
+        for record in records
+        if record['post_id'] in post_ids and record['author_id'] in author_ids
+    ]
+    if not comments:
+        return 0
+    Comment.objects.bulk_create(comments)
+    if comments[0].pk is None:
+        # SQLite не возвращает id из bulk_create. Пока транзакция держит
+        # запись, последние строки таблицы — эта пачка.
+        ids = list(Comment.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        )[:len(comments)])
+        for comment, pk in zip(comments, reversed(ids)):
+            comment.pk = pk
+    for author_id, count in Counter(
+        comment.author_id for comment in comments
+    ).items():
+        UserStats.objects.change(author_id, comments_count=count)
+    feed_cache.invalidate(*{
+        feed_cache.post_card(comment.post_id) for comment in comments
+    })
+    for comment in comments:
+        search.index(comment)
+    trending.record({
+        post_id: count * trending.COMMENT_WEIGHT
+        for post_id, count in Counter(
+            comment.post_id for comment in comments
+        ).items()
+    })
+    return len(comments)
+
+
+def save_chunks(records, size):
+    """
+    Пишет файл пачки по ``size`` строк на INSERT, но в одной транзакции:
+    файл удаляется после её коммита, и повтор не задвоит уже записанное.
+    """
+    return sum(
+        save_comments(records[start:start + size])
+        for start in range(0, len(records), size)
+    )
+
+
+class CommentBuffer:
+    """
+    Файл-очередь процесса ``<pid>.jsonl`` и пачки ``<pid>-<время>.batch``,
+    на которые она делится при каждом сбросе.
+    """
+
+    def __init__(self, directory, interval=0.2, batch_size=500):
+        self.directory = directory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        os.makedirs(directory, exist_ok=True)
+        self.spool_path = os.path.join(directory, f'{self.pid}.jsonl')
+        self.spool = open(self.spool_path, 'a', encoding='utf-8')
+
+    def add(self, comment):
+        line = json.dumps({
+            'post_id': comment.post_id,
+            'author_id': comment.author_id,
+            'text': comment.text,
+        }, ensure_ascii=False)
+        with self.lock:
+            self.spool.write(line + '\n')
+            self.spool.flush()
+
+    def close(self):
+        """Закрывает очередь; пустой файл очереди не оставляет."""
+        with self.lock:
+            self.spool.close()
+            if not os.path.getsize(self.spool_path):
+                os.remove(self.spool_path)
+
+    def batch_path(self):
+        return os.path.join(
+            self.directory, f'{self.pid}-{time.time_ns()}.batch'
+        )
+
+    def rotate(self):
+        """Накопленное в очереди становится пачкой, очередь — пустой."""
+        with self.lock:
+            if not self.spool.tell():
+                return
+            self.spool.close()
+            os.replace(self.spool_path, self.batch_path())
+            self.spool = open(self.spool_path, 'a', encoding='utf-8')
+
+    def claim_orphans(self):
+        """
+        Очереди и пачки умерших процессов становятся пачками этого.
+        Отложенные ``.failed`` не трогаются: их разбирают вручную.
+        """
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.failed'):
+                logger.warning('Отложенная пачка комментариев %s', name)
+                continue
+            pid = name.split('.')[0].split('-')[0]
+            if not pid.isdigit() or int(pid) == self.pid:
+                continue
+            if is_alive(int(pid)):
+                continue
+            try:
+                os.replace(os.path.join(self.directory, name),
+                           self.batch_path())
+            except FileNotFoundError:
+                # Забрал другой процесс.
+                continue
+
+    def batches(self):
+        prefix = f'{self.pid}-'
+        return [
+            os.path.join(self.directory, name)
+            for name in sorted(os.listdir(self.directory))
+            if name.startswith(prefix) and name.endswith('.batch')
+        ]
+
+    def save_batch(self, path):
+        with open(path, encoding='utf-8') as file:
+            records = []
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Недописанная при падении последняя строка.
+                    continue
+        return write(save_chunks, records, self.batch_size)
+
+    def flush(self):
+        """
+        Пишет все пачки процесса. Пачка, которую не приняла база, ждёт
+        следующего сброса; пачка с ошибкой в данных откладывается в
+        ``.failed``, чтобы не держать остальные.
+        """
+        self.rotate()
+        saved = 0
+        for path in self.batches():
+            try:
+                saved += self.save_batch(path)
+            except OperationalError:
+                raise
+            except Exception:
+                logger.exception('Пачка комментариев %s не записана', path)
+                os.replace(path, path + '.failed')
+                continue
+            os.remove(path)
+        return saved
+
+    def run(self):
+        self.claim_orphans()
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать комментарии')
+            finally:
+                close_old_connections()
+
+    def start(self):
+        threading.Thread(
+            target=self.run, name='yatube-comments', daemon=True
+        ).start()
+
+
+def get_buffer():
+    global _buffer
+    with _lock:
+        if _buffer is None or _buffer.pid != os.getpid():
+            _buffer = CommentBuffer(
+                settings.COMMENT_BUFFER_DIR,
+                getattr(settings, 'COMMENT_BUFFER_INTERVAL', 0.2),
+                getattr(settings, 'COMMENT_BUFFER_BATCH', 500),
+            )
+            _buffer.start()
+    return _buffer
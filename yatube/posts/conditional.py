@@ -0,0 +1,143 @@
+"""
+Условные ответы HTML-страниц.
+
+Страница зависит от версий в кеше (см. ``feed_cache``): ленты, карточек
+её постов, профиля автора. ``ETag`` — хеш этих версий и того, кто
+смотрит, ``Last-Modified`` — время последнего их сброса. Всё это
+читается из кеша и пары запросов по первичному ключу, поэтому
+неизменившаяся страница отвечает ``304`` до выборки постов и рендера.
+Страница, id постов которой ещё нет в кеше, отдаётся как обычно.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import feed_cache
+from .feed_cache import CachedCursorPaginator
+from .models import Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+def _feed_names(request, feed):
+    # Размер страницы не входит в ключ кеша ленты.
+    ids = CachedCursorPaginator(Post.objects.all(), 1, feed=feed).cached_ids(
+        request.GET.get('cursor')
+    )
+    if ids is None:
+        return None
+    return [feed, feed_cache.CARDS, *map(feed_cache.post_card, ids)]
+
+
+def index_state(request):
+    return _feed_names(request, feed_cache.index_feed()), ()
+
+
+def group_state(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None, ()
+    return _feed_names(request, feed_cache.group_feed(group_id)), ()
+
+
+def profile_state(request, username):
+    """Счётчики и кнопка подписки версий не имеют: они идут в ETag."""
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None, ()
+    stats = UserStats.objects.filter(user_id=author_id).values_list(
+        'posts_count', 'followers_count', 'following_count',
+        'comments_count',
+    ).first()
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author_id=author_id
+    ).exists()
+    names = _feed_names(request, feed_cache.profile_feed(author_id))
+    return names, (stats, following)
+
+
+def post_detail_state(request, post_id):
+    """Число постов автора меняется вместе с версией его профиля."""
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None, ()
+    names = [
+        feed_cache.post_card(post_id), feed_cache.CARDS,
+        feed_cache.profile_feed(author_id),
+    ]
+    return names, ()
+
+
+def page_etag(request, names, extra):
+    if names is None:
+        return None
+    versions = feed_cache.get_versions(*names)
+    viewer = request.user.pk if request.user.is_authenticated else 0
+    raw = repr((viewer, [versions[name] for name in names], extra))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_last_modified(names, extra):
+    """Прочие значения без времени изменения отключают Last-Modified."""
+    if names is None or extra:
+        return None
+    changed = feed_cache.changed_at(*names)
+    if changed is None:
+        return None
+    return datetime.fromtimestamp(changed, tz=timezone.utc)
+
+
+def private_cache_headers(request, response):
+    """
+    Ответ зависит от сессии, поэтому ``Vary: Cookie``; для вошедших он
+    ``private``. ``no-cache``: кешировать можно, но перед показом
+    сверяться с сервером.
+    """
+    patch_vary_headers(response, ['Cookie'])
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+
+
+def private_page(view):
+    """Заголовки кеша условных страниц для страниц без версий и ETag."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        private_cache_headers(request, response)
+        return response
+    return wrapper
+
+
+def conditional_page(state):
+    """
+    Оборачивает view в ``condition()`` с ETag и Last-Modified из
+    ``state(request, *args, **kwargs)`` — пары «имена версий, прочие
+    значения». Адрес страницы (и курсор в нём) уже отличает один ETag от
+    другого, поэтому в ``state`` он не входит.
+    """
+    def get_state(request, *args, **kwargs):
+        if not hasattr(request, '_page_state'):
+            request._page_state = state(request, *args, **kwargs)
+        return request._page_state
+
+    def etag(request, *args, **kwargs):
+        return page_etag(request, *get_state(request, *args, **kwargs))
+
+    def last_modified(request, *args, **kwargs):
+        return page_last_modified(*get_state(request, *args, **kwargs))
+
+    def decorator(view):
+        return private_page(condition(etag, last_modified)(view))
+    return decorator
@@ -0,0 +1,189 @@
+"""
+Версионированный кеш лент.
+
+У каждой ленты (главная, группа, профиль) и у каждого поста есть номер
+версии в кеше. Ключи кеша включают версию, поэтому сбросить кеш — это
+увеличить номер: старые записи просто перестают читаться и вытесняются
+сами. Версии увеличивают сигналы при создании, правке и удалении
+постов и комментариев.
+
+В кеше лежат:
+
+* списки id постов каждой страницы ленты и общее число постов ленты;
+* отрендеренные карточки постов (``posts/includes/post_card.html``),
+  ключ которых строится из id поста и его версии.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core import routers
+
+from .paginators import CursorPaginator, InvalidCursor
+from .timelines import TimelinePaginator
+
+FEED_CACHE_TIMEOUT = getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 15)
+CARDS = 'cards'
+
+
+def index_feed():
+    return 'index'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def profile_feed(author_id):
+    return f'profile:{author_id}'
+
+
+def post_card(post_id):
+    return f'post:{post_id}'
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def _changed_key(name):
+    return f'changed:{name}'
+
+
+def get_versions(*names):
+    """
+    Текущие версии по именам. Пропавшая из кеша версия заводится
+    заново от текущего времени, чтобы не совпасть ни с одной прежней;
+    временем её изменения считается текущее.
+    """
+    keys = {_version_key(name): name for name in names}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+            cache.add(_changed_key(keys[key]), now, timeout=None)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: versions.get(key, 0) for key in keys}
+
+
+def bump(*names):
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+    now = time.time()
+    cache.set_many({_changed_key(name): now for name in names}, timeout=None)
+
+
+def changed_at(*names):
+    """
+    Время последнего сброса версий ``names`` (для Last-Modified) или
+    None, если хоть одна ещё не сбрасывалась или вытеснена из кеша.
+    """
+    keys = {_changed_key(name) for name in names}
+    times = cache.get_many(keys)
+    if len(times) < len(keys):
+        return None
+    return max(times.values())
+
+
+def invalidate(*names):
+    """
+    Сбрасывает версии сразу и ещё раз после коммита: иначе читатель
+    между сигналом и коммитом закешировал бы старые данные под новой
+    версией.
+    """
+    bump(*names)
+    transaction.on_commit(lambda: bump(*names))
+
+
+def attach_card_versions(posts):
+    """Проставляет постам ``cache_version`` для кеша карточек."""
+    versions = get_versions(CARDS, *(post_card(post.pk) for post in posts))
+    namespace = routers.cache_namespace()
+    for post in posts:
+        post.cache_version = '{}.{}'.format(
+            versions[CARDS], versions[post_card(post.pk)]
+        )
+        if namespace is not None:
+            post.cache_version += f'@{namespace}'
+
+
+def _make_key(*parts):
+    raw = ':'.join(str(part) for part in parts)
+    return 'feed:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+class FeedCacheMixin:
+    """
+    Кеширует для паджинатора списки id страниц ленты ``feed`` и число
+    её постов. Посты страницы при попадании в кеш достаются одним
+    запросом по первичному ключу.
+    """
+    feed = None
+
+    def _page_key(self, value, pk, before):
+        version = get_versions(self.feed)[self.feed]
+        return _make_key(self.feed, version, routers.cache_namespace(),
+                         value, pk, before)
+
+    def cached_ids(self, cursor=None):
+        """
+        id постов страницы по курсору, если они уже в кеше, иначе None.
+        К базе не обращается; битый курсор — как первая страница.
+        """
+        value = pk = None
+        before = False
+        if cursor:
+            try:
+                value, pk, _, before = self.decode_cursor(cursor)
+            except InvalidCursor:
+                pass
+        return cache.get(self._page_key(value, pk, before))
+
+    def _seek(self, value, pk, before):
+        if self.feed is None:
+            return super()._seek(value, pk, before)
+        key = self._page_key(value, pk, before)
+        ids = cache.get(key)
+        if ids is None:
+            rows = super()._seek(value, pk, before)
+            cache.set(key, [row.pk for row in rows],
+                      routers.cache_timeout(FEED_CACHE_TIMEOUT))
+            return rows
+        posts = self.object_list.in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+    @property
+    def count(self):
+        if self.feed is None or self.with_count is not True:
+            return super().count
+        version = get_versions(self.feed)[self.feed]
+        key = _make_key(self.feed, version, routers.cache_namespace(),
+                        'count', self.count_limit)
+        count = cache.get(key)
+        if count is None:
+            count = self.count_rows()
+            cache.set(key, count, routers.cache_timeout(FEED_CACHE_TIMEOUT))
+        return count
+
+    def _build_page(self, rows, *args, **kwargs):
+        attach_card_versions(rows)
+        return super()._build_page(rows, *args, **kwargs)
+
+
+class CachedCursorPaginator(FeedCacheMixin, CursorPaginator):
+    def __init__(self, object_list, per_page, feed=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.feed = feed
+
+
+class CachedTimelinePaginator(FeedCacheMixin, TimelinePaginator):
+    """Лента подписок у каждого своя: кешируются только карточки."""
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.comment_buffer import CommentBuffer
+
+
+class Command(BaseCommand):
+    help = (
+        'Записывает в базу комментарии, оставшиеся в очереди '
+        'остановленных процессов'
+    )
+
+    def handle(self, *args, **options):
+        buffer = CommentBuffer(
+            settings.COMMENT_BUFFER_DIR,
+            batch_size=settings.COMMENT_BUFFER_BATCH,
+        )
+        buffer.claim_orphans()
+        try:
+            saved = buffer.flush()
+        finally:
+            buffer.close()
+        self.stdout.write(f'Записано комментариев: {saved}')
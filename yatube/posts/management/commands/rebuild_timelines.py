@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timelines
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пересобрать только ленты этих пользователей',
+        )
+
+    def handle(self, *args, **options):
+        if not options['usernames']:
+            total = timelines.rebuild_all()
+            self.stdout.write(f'Записей в лентах: {total}')
+            return
+        users = User.objects.filter(
+            follower__isnull=False, username__in=options['usernames']
+        ).distinct()
+        total = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            timelines.rebuild(user_id)
+            total += 1
+        self.stdout.write(f'Пересобрано лент: {total}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счета ленты популярного по постам и комментариям'
+
+    def handle(self, *args, **options):
+        total = trending.rebuild()
+        self.stdout.write(f'Пересчитано постов: {total}')
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import seeding
+from posts.models import Comment, Follow, Post, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя',
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности авторов',
+        )
+        parser.add_argument('--seed', type=int, default=13)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--drop-indexes', action='store_true',
+            help='Снять вторичные индексы на время загрузки (SQLite)',
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс',
+        )
+
+    def log(self, message):
+        self.stdout.write(f'[{time.monotonic() - self.started:7.1f}s] '
+                          f'{message}')
+
+    def handle(self, *args, **options):
+        self.started = time.monotonic()
+        dataset = seeding.Dataset(
+            users=options['users'], groups=options['groups'],
+            posts=options['posts'], comments=options['comments'],
+            follows=options['follows'], exponent=options['exponent'],
+            seed=options['seed'], batch_size=options['batch_size'],
+        )
+        models = (Post, Comment, Follow, TimelineEntry)
+        if not options['drop_indexes']:
+            models = ()
+        with seeding.dropped_indexes(*models) as dropped:
+            if dropped:
+                self.log(f'Сняты индексы: {", ".join(dropped)}')
+            counts = dataset.load(log=self.log)
+            self.log('Строим индексы')
+        if not options['skip_derived']:
+            seeding.finish(log=self.log)
+        self.log('Готово: ' + ', '.join(
+            f'{name} {count}' for name, count in counts.items()
+        ))
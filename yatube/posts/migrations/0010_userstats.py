@@ -0,0 +1,62 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:31
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def backfill_stats(apps, schema_editor):
+    """Счётчики уже зарегистрированных пользователей."""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    Comment = apps.get_model('posts', 'Comment')
+    UserStats = apps.get_model('posts', 'UserStats')
+    counters = {
+        'posts_count': Post.objects.values_list('author')
+        .annotate(total=Count('pk')).order_by(),
+        'followers_count': Follow.objects.values_list('author')
+        .annotate(total=Count('pk')).order_by(),
+        'following_count': Follow.objects.values_list('user')
+        .annotate(total=Count('pk')).order_by(),
+        'comments_count': Comment.objects.values_list('author')
+        .annotate(total=Count('pk')).order_by(),
+    }
+    counters = {field: dict(rows) for field, rows in counters.items()}
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=user_id, **{
+                field: totals.get(user_id, 0)
+                for field, totals in counters.items()
+            })
+            for user_id in User.objects.values_list('pk', flat=True)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0009_auto_20220626_1947'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
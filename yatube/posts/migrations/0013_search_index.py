@@ -0,0 +1,35 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_index(apps, schema_editor):
+    """
+    Таблица FTS5 заводится только на SQLite, где есть FTS5; без неё
+    поиск работает по индексу в памяти. Заполняет её после migrate
+    ``posts.search.fill_index``: формат строк индекса — код приложения,
+    а не история миграций.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE posts_search USING fts5(body)'
+        )
+    except OperationalError:
+        return
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_postimagevariant'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth import get_user_model
 
 from core.models import CreatedModel
@@ -15,6 +19,37 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """
+        Посты для лент: автор и группа приходят одним JOIN, из таблиц
+        берутся только колонки, которые выводит карточка поста. Копии
+        картинок для srcset добираются одним запросом на страницу.
+        """
+        return self.select_related('author', 'group').only(
+            'id', 'text', 'pub_date', 'image', 'author_id', 'group_id',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__title', 'group__slug',
+        ).prefetch_related(models.Prefetch(
+            'image_variants',
+            # Порядок индекса (post, width): копии идут без сортировки.
+            queryset=PostImageVariant.objects.order_by('post_id', 'width'),
+        )).with_comment_count()
+
+    def with_comment_count(self):
+        """
+        Число комментариев коррелированным подзапросом: он считается
+        только для строк страницы, а не через GROUP BY по всей ленте.
+        """
+        comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+        comments = comments.values('post').annotate(
+            total=Count('pk')
+        ).values('total')
+        return self.annotate(comment_count=Coalesce(
+            Subquery(comments, output_field=IntegerField()), 0
+        ))
+
+
 class Post(CreatedModel):
     text = models.TextField(
         verbose_name='Содержание поста',
@@ -42,6 +77,8 @@ class Post(CreatedModel):
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     def __str__(self):
         return self.text[:15]
 
@@ -49,6 +86,48 @@ class Post(CreatedModel):
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Под keyset-паджинацию лент: фильтр, затем (pub_date, id).
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+        ]
+
+
+class PostImageVariant(models.Model):
+    """Уменьшенная копия картинки поста для ``srcset``."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+        verbose_name='Пост',
+    )
+    file = models.FileField('Файл', upload_to='posts/variants/')
+    content_type = models.CharField('MIME-тип', max_length=32)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    size = models.PositiveIntegerField('Размер в байтах')
+
+    class Meta:
+        ordering = ['width']
+        verbose_name = 'Копия картинки'
+        verbose_name_plural = 'Копии картинок'
+        indexes = [
+            models.Index(
+                fields=['post', 'width'], name='variant_post_width_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.file.name} ({self.width}w)'
 
 
 class Comment(CreatedModel):
@@ -69,6 +148,14 @@ class Comment(CreatedModel):
         help_text='Текст нового комментария',
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'pub_date', 'id'],
+                name='comment_post_pub_date_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -87,5 +174,175 @@ class Follow(models.Model):
         verbose_name='Автор',
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow',
+            ),
+        ]
+
     def __str__(self):
         return self.title
+
+
+class UserStatsManager(models.Manager):
+    def for_user(self, user):
+        """
+        Строка счётчиков пользователя; недостающая считается с нуля.
+        Посчитанная строка читается из основной базы: реплика её ещё
+        не видит.
+        """
+        try:
+            return self.get(user=user)
+        except self.model.DoesNotExist:
+            self.recount(User.objects.filter(pk=user.pk))
+            return self.db_manager(DEFAULT_DB_ALIAS).get(user=user)
+
+    def recount(self, users=None, batch_size=1000):
+        """Пересчитывает счётчики пачкой агрегирующих запросов."""
+        if users is None:
+            users = User.objects.all()
+        user_ids = users.values('pk')
+        counters = {
+            'posts_count': Post.objects.filter(author__in=user_ids)
+            .values_list('author').annotate(total=Count('pk')).order_by(),
+            'followers_count': Follow.objects.filter(author__in=user_ids)
+            .values_list('author').annotate(total=Count('pk')).order_by(),
+            'following_count': Follow.objects.filter(user__in=user_ids)
+            .values_list('user').annotate(total=Count('pk')).order_by(),
+            'comments_count': Comment.objects.filter(author__in=user_ids)
+            .values_list('author').annotate(total=Count('pk')).order_by(),
+        }
+        counters = {field: dict(rows) for field, rows in counters.items()}
+        rows = (
+            self.model(user_id=user_id, **{
+                field: totals.get(user_id, 0)
+                for field, totals in counters.items()
+            })
+            for user_id in users.values_list('pk', flat=True).iterator()
+        )
+        total = 0
+        with transaction.atomic():
+            self.filter(user__in=user_ids).delete()
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    return total
+                self.bulk_create(batch)
+                total += len(batch)
+
+    def change(self, user_id, **deltas):
+        """
+        Сдвигает счётчики на ``deltas`` одним UPDATE. Вызывается после
+        изменения в базе, поэтому недостающая строка не заводится с нуля,
+        а пересчитывается вместе с ним — и только при увеличении
+        счётчиков.
+        """
+        if user_id is None:
+            return
+        changes = {
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        }
+        with transaction.atomic():
+            if self.filter(user_id=user_id).update(**changes):
+                return
+            if all(delta < 0 for delta in deltas.values()):
+                return
+            self.recount(User.objects.filter(pk=user_id))
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+
+    objects = UserStatsManager()
+
+    def __str__(self):
+        return f'Статистика {self.user_id}'
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+
+class TrendingScore(models.Model):
+    """Счёт поста в ленте популярного (см. posts/trending.py)."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Пост',
+    )
+    group = models.ForeignKey(
+        Group,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Группа поста',
+    )
+    score = models.FloatField('Счёт')
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.2f}'
+
+    class Meta:
+        verbose_name = 'Счёт популярности'
+        verbose_name_plural = 'Счета популярности'
+        indexes = [
+            models.Index(
+                fields=['-score', '-post'], name='trending_score_idx',
+            ),
+            models.Index(
+                fields=['group', '-score', '-post'],
+                name='trending_group_score_idx',
+            ),
+        ]
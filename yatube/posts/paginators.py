@@ -0,0 +1,188 @@
+import base64
+import binascii
+import json
+import math
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+ELLIPSIS = '…'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def elided_page_range(number, num_pages, on_each_side=2, on_ends=1):
+    """
+    Номера страниц для навигации: ``on_ends`` с каждого края и
+    ``on_each_side`` вокруг текущей, пропуски между ними — ``ELLIPSIS``.
+    Число ссылок не зависит от числа страниц.
+    """
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        yield from range(1, num_pages + 1)
+        return
+    if number > on_each_side + on_ends + 2:
+        yield from range(1, on_ends + 1)
+        yield ELLIPSIS
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends - 1:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield ELLIPSIS
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+def seek_condition(key, pk_field, value, pk, before=False):
+    """Условие ``(key, pk) < (value, pk)``, или ``>`` для ``before``."""
+    op = 'gt' if before else 'lt'
+    return (
+        Q(**{f'{key}__{op}': value})
+        | Q(**{key: value, f'{pk_field}__{op}': pk})
+    )
+
+
+class CursorPaginator(Paginator):
+    """
+    Keyset-паджинатор по паре (key, pk).
+
+    Вместо OFFSET страница выбирается условием
+    ``key < x OR (key = x AND pk < y)``, поэтому любая страница ленты
+    читается по индексу за одинаковое время. Курсоры непрозрачны для
+    клиента: это base64 от позиции последней (или первой) записи.
+    С ``count=False`` паджинатор не делает ``COUNT(*)`` вообще, а число
+    в ``count`` принимается как уже известное количество записей.
+
+    Страницы остаются обычными ``Page``, но навигацию по ним нужно
+    строить по атрибутам ``previous_cursor`` и ``next_cursor``.
+    С ``ascending=True`` записи идут от старых к новым (комментарии).
+    С ``count_limit`` подсчёт останавливается на ``count_limit + 1``
+    записи: для огромных лент число страниц тогда приблизительное
+    («не меньше»), зато стоит ограниченное время.
+    """
+
+    def __init__(self, object_list, per_page, key='pub_date', count=True,
+                 ascending=False, count_limit=None):
+        sign = '' if ascending else '-'
+        super().__init__(
+            object_list.order_by(f'{sign}{key}', f'{sign}pk'), per_page
+        )
+        self.key = key
+        self.with_count = count
+        self.ascending = ascending
+        self.count_limit = count_limit
+
+    @cached_property
+    def key_field(self):
+        return self.object_list.model._meta.get_field(self.key)
+
+    def count_rows(self):
+        # values('pk') отбрасывает аннотации ленты из подсчёта.
+        rows = self.object_list.values('pk')
+        if self.count_limit is not None:
+            rows = rows[:self.count_limit + 1]
+        return rows.count()
+
+    @cached_property
+    def count(self):
+        if self.with_count is False:
+            return None
+        if self.with_count is not True:
+            return self.with_count
+        return self.count_rows()
+
+    @property
+    def count_exact(self):
+        return (self.count_limit is None or self.count is None
+                or self.count <= self.count_limit)
+
+    @cached_property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        count = self.count if self.count_exact else self.count_limit
+        return max(math.ceil(count / self.per_page), 1)
+
+    def encode_cursor(self, obj, number, before=False):
+        value = getattr(obj, self.key)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        position = {'v': value, 'pk': obj.pk, 'n': number, 'b': before}
+        raw = json.dumps(position, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            position = json.loads(raw.decode())
+            value = self.key_field.to_python(position['v'])
+            pk = int(position['pk'])
+            number = max(int(position['n']), 1)
+            before = bool(position['b'])
+        except (binascii.Error, ValueError, TypeError, KeyError,
+                ValidationError):
+            raise InvalidCursor('Некорректный курсор страницы')
+        if value is None:
+            raise InvalidCursor('Некорректный курсор страницы')
+        return value, pk, number, before
+
+    def _seek(self, value, pk, before):
+        """
+        Первые ``per_page + 1`` записей после позиции (value, pk);
+        с ``before=True`` — до неё, в обратном порядке.
+        """
+        queryset = self.object_list
+        if value is not None:
+            queryset = queryset.filter(seek_condition(
+                self.key, 'pk', value, pk, before != self.ascending
+            ))
+        if before:
+            queryset = queryset.reverse()
+        return list(queryset[:self.per_page + 1])
+
+    def page(self, cursor=None):
+        if not cursor:
+            rows = self._seek(None, None, False)
+            return self._build_page(rows[:self.per_page], 1,
+                                    has_newer=False,
+                                    has_older=len(rows) > self.per_page)
+        value, pk, number, before = self.decode_cursor(cursor)
+        rows = self._seek(value, pk, before)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            raise InvalidCursor('Страница по курсору пуста')
+        if before:
+            rows.reverse()
+            if not has_more:
+                number = 1
+            return self._build_page(rows, number,
+                                    has_newer=has_more, has_older=True)
+        return self._build_page(rows, number,
+                                has_newer=True, has_older=has_more)
+
+    def get_page(self, cursor=None):
+        """Как Paginator.get_page: битый курсор ведёт на первую страницу."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    def _build_page(self, rows, number, has_newer, has_older):
+        previous_cursor = next_cursor = None
+        if rows and has_newer:
+            previous_cursor = self.encode_cursor(
+                rows[0], number - 1, before=True
+            )
+        if rows and has_older:
+            next_cursor = self.encode_cursor(rows[-1], number + 1)
+        page = self._get_page(rows, number, self)
+        page.previous_cursor = previous_cursor
+        page.next_cursor = next_cursor
+        return page
@@ -0,0 +1,301 @@
+"""
+Полнотекстовый поиск по постам, комментариям и названиям групп.
+
+Текст режется на слова, слова приводятся к основе русским стеммером
+(``posts/stemmer.py``) и складываются в инвертированный индекс:
+
+* на SQLite с FTS5 — в виртуальную таблицу ``posts_search`` (её создаёт
+  миграция), ранжирование — встроенная функция ``bm25``;
+* иначе — в индекс в памяти процесса с тем же BM25. Он строится из базы
+  при первом поиске, поэтому годится для разработки и тестов, а не для
+  нескольких воркеров.
+
+Индекс обновляют сигналы при сохранении и удалении объектов. Номер
+строки FTS-таблицы кодирует вид объекта и его id, поэтому замена и
+удаление документа — поиск по первичному ключу, а не скан таблицы.
+"""
+import math
+import re
+import threading
+from collections import Counter, defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .stemmer import stem
+
+SEARCH_BACKEND = getattr(settings, 'SEARCH_BACKEND', 'auto')
+RESULTS_LIMIT = 1000
+SNIPPET_LENGTH = 200
+
+TABLE = 'posts_search'
+KINDS = ('post', 'comment', 'group')
+
+WORD = re.compile(r'\w+')
+
+Hit = namedtuple('Hit', 'kind object_id score')
+Result = namedtuple('Result', 'kind object url snippet')
+
+
+def terms(text):
+    return [stem(word) for word in WORD.findall(text)]
+
+
+def document(instance):
+    """Вид, id и индексируемый текст объекта."""
+    from .models import Comment, Group, Post
+    if isinstance(instance, Post):
+        return 'post', instance.pk, instance.text
+    if isinstance(instance, Comment):
+        return 'comment', instance.pk, instance.text
+    if isinstance(instance, Group):
+        return 'group', instance.pk, instance.title
+    raise TypeError(f'{type(instance).__name__} не индексируется')
+
+
+def documents():
+    from .models import Comment, Group, Post
+    for kind, model, field in (
+        ('post', Post, 'text'),
+        ('comment', Comment, 'text'),
+        ('group', Group, 'title'),
+    ):
+        rows = model.objects.order_by().values_list('pk', field)
+        for object_id, text in rows.iterator():
+            yield kind, object_id, text
+
+
+def rowid(kind, object_id):
+    return object_id * len(KINDS) + KINDS.index(kind)
+
+
+def from_rowid(value):
+    object_id, kind = divmod(value, len(KINDS))
+    return KINDS[kind], object_id
+
+
+class FtsIndex:
+    """Индекс в таблице SQLite FTS5."""
+
+    def add(self, kind, object_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {TABLE} (rowid, body) '
+                'VALUES (%s, %s)',
+                [rowid(kind, object_id), ' '.join(terms(text))],
+            )
+
+    def remove(self, kind, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid = %s',
+                [rowid(kind, object_id)],
+            )
+
+    def rebuild(self, rows):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, body) VALUES (%s, %s)',
+                (
+                    (rowid(kind, object_id), ' '.join(terms(text)))
+                    for kind, object_id, text in rows
+                ),
+            )
+
+    def search(self, stems, limit):
+        query = ' '.join('"{}"'.format(term.replace('"', '""'))
+                         for term in stems)
+        with connection.cursor() as cursor:
+            # bm25 в FTS5 тем меньше, чем документ релевантнее.
+            cursor.execute(
+                f'SELECT rowid, -bm25({TABLE}) FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s ORDER BY bm25({TABLE}) LIMIT %s',
+                [query, limit],
+            )
+            return [Hit(*from_rowid(row), score) for row, score in cursor]
+
+
+class MemoryIndex:
+    """Инвертированный индекс в памяти процесса с ранжированием BM25."""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.lengths = {}
+        self.loaded = False
+        self.lock = threading.RLock()
+
+    def _load(self):
+        if not self.loaded:
+            self.rebuild(documents())
+
+    def add(self, kind, object_id, text):
+        with self.lock:
+            self.remove(kind, object_id)
+            counts = Counter(terms(text))
+            for term, count in counts.items():
+                self.postings[term][kind, object_id] = count
+            self.documents[kind, object_id] = list(counts)
+            self.lengths[kind, object_id] = sum(counts.values())
+
+    def remove(self, kind, object_id):
+        with self.lock:
+            self.lengths.pop((kind, object_id), None)
+            for term in self.documents.pop((kind, object_id), ()):
+                docs = self.postings[term]
+                docs.pop((kind, object_id), None)
+                if not docs:
+                    del self.postings[term]
+
+    def rebuild(self, rows):
+        with self.lock:
+            self.postings.clear()
+            self.documents.clear()
+            self.lengths.clear()
+            self.loaded = True
+            for kind, object_id, text in rows:
+                self.add(kind, object_id, text)
+
+    def search(self, stems, limit):
+        with self.lock:
+            self._load()
+            postings = [self.postings.get(term, {}) for term in stems]
+            if not postings or not all(postings):
+                return []
+            docs = set.intersection(*(set(docs) for docs in postings))
+            total = len(self.lengths)
+            average = sum(self.lengths.values()) / total
+            scores = Counter()
+            for docs_with_term in postings:
+                found = len(docs_with_term)
+                idf = math.log((total - found + 0.5) / (found + 0.5) + 1)
+                for doc in docs:
+                    count = docs_with_term[doc]
+                    norm = 1 - self.b + self.b * self.lengths[doc] / average
+                    scores[doc] += idf * count * (self.k1 + 1) / (
+                        count + self.k1 * norm
+                    )
+        return [
+            Hit(kind, object_id, score)
+            for (kind, object_id), score in scores.most_common(limit)
+        ]
+
+
+_memory_index = MemoryIndex()
+_fts_available = None
+
+
+def get_index():
+    global _fts_available
+    if SEARCH_BACKEND == 'memory':
+        return _memory_index
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and TABLE in connection.introspection.table_names()
+        )
+    return FtsIndex() if _fts_available else _memory_index
+
+
+def index(instance):
+    get_index().add(*document(instance))
+
+
+def unindex(instance):
+    kind, object_id, _ = document(instance)
+    get_index().remove(kind, object_id)
+
+
+def rebuild():
+    get_index().rebuild(documents())
+
+
+def fill_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    После migrate заполняет пустую таблицу FTS5: миграция создаёт её
+    без строк. Заполненную не трогает.
+    """
+    if using != DEFAULT_DB_ALIAS or connection.vendor != 'sqlite':
+        return
+    if TABLE not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {TABLE} LIMIT 1')
+        if cursor.fetchone() is not None:
+            return
+    FtsIndex().rebuild(documents())
+
+
+def search(query, limit=RESULTS_LIMIT):
+    """Находки по убыванию релевантности: все слова запроса в тексте."""
+    stems = list(dict.fromkeys(term for term in terms(query) if term))
+    if not stems:
+        return []
+    return get_index().search(stems, limit)
+
+
+def results(hits, query):
+    """Объекты для страницы находок с адресами и подсвеченными фрагментами."""
+    from .models import Comment, Group, Post
+    ids = defaultdict(list)
+    for hit in hits:
+        ids[hit.kind].append(hit.object_id)
+    objects = {
+        'post': Post.objects.select_related('author', 'group')
+        .in_bulk(ids['post']),
+        'comment': Comment.objects.select_related('author', 'post')
+        .in_bulk(ids['comment']),
+        'group': Group.objects.in_bulk(ids['group']),
+    }
+    found = []
+    for hit in hits:
+        instance = objects[hit.kind].get(hit.object_id)
+        if instance is None:
+            continue
+        if hit.kind == 'group':
+            url = reverse('posts:group_list', args=[instance.slug])
+        elif hit.kind == 'comment':
+            url = reverse('posts:post_detail', args=[instance.post_id])
+        else:
+            url = reverse('posts:post_detail', args=[instance.pk])
+        found.append(Result(
+            hit.kind, instance, url,
+            highlight(document(instance)[2], query),
+        ))
+    return found
+
+
+def highlight(text, query, length=SNIPPET_LENGTH):
+    """
+    Фрагмент ``text`` вокруг первого найденного слова запроса, слова
+    запроса выделены ``<mark>``.
+    """
+    stems = set(terms(query))
+    matches = [
+        match for match in WORD.finditer(text) if stem(match.group()) in stems
+    ]
+    start = 0
+    if matches and matches[0].start() > length // 2:
+        start = text.rfind(' ', 0, matches[0].start() - length // 4) + 1
+    end = min(len(text), start + length)
+    parts = ['…' if start else '']
+    position = start
+    for match in matches:
+        if match.start() < start:
+            continue
+        if match.end() > end:
+            break
+        parts.append(escape(text[position:match.start()]))
+        parts.append(f'<mark>{escape(match.group())}</mark>')
+        position = match.end()
+    parts.append(escape(text[position:end]))
+    if end < len(text):
+        parts.append('…')
+    return mark_safe(''.join(parts))
@@ -0,0 +1,242 @@
+"""
+Детерминированный генератор больших наборов данных: для команды
+``seed_yatube`` и бенчмарков (``benchmarks/views.py``).
+
+При одном ``seed`` получается один и тот же набор: пользователи с
+именами из Faker, группы, посты, комментарии и подписки. Популярность
+авторов распределена по Ципфу: немногие авторы пишут большую часть
+постов и собирают большую часть подписчиков, как в живой соцсети.
+
+Строки генерируются потоком и пишутся ``bulk_create`` пачками по
+``batch_size``, так что память не растёт с размером набора. Первичные
+ключи назначаются заранее, поэтому связи между таблицами не требуют
+чтения из базы. ``bulk_create`` не шлёт сигналов: счётчики, ленты
+подписок и поисковый индекс пересчитывает ``finish()``.
+
+На SQLite на время загрузки можно снять вторичные индексы таблиц
+(``dropped_indexes``): строить их один раз по готовым данным быстрее,
+чем обновлять на каждой вставке.
+"""
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max
+from faker import Faker
+
+from posts import search, timelines, trending
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+PASSWORD = 'benchmark'
+START = datetime(2022, 1, 1, tzinfo=timezone.utc)
+SPAN = timedelta(days=365)
+
+
+@contextmanager
+def explicit_dates(*models):
+    """Отключает ``auto_now_add``, чтобы сохранить сгенерированные даты."""
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+@contextmanager
+def dropped_indexes(*models):
+    """
+    Снимает вторичные индексы таблиц моделей и возвращает их после
+    загрузки. Индексы уникальности и первичные ключи остаются. Только
+    для SQLite: на других базах ничего не делает.
+    """
+    if connection.vendor != 'sqlite':
+        yield []
+        return
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+            "AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%%' "
+            f"AND tbl_name IN ({', '.join(['%s'] * len(tables))})",
+            tables,
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    try:
+        yield [name for name, _ in indexes]
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+def next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class Dataset:
+    def __init__(self, users=1000, groups=50, posts=20000, comments=20000,
+                 follows=20, seed=13, batch_size=5000, exponent=1.1):
+        self.sizes = {
+            'users': users, 'groups': groups, 'posts': posts,
+            'comments': comments,
+        }
+        self.follows_per_user = follows
+        self.seed = seed
+        self.batch_size = batch_size
+        self.exponent = exponent
+
+    def _rng(self, name):
+        return random.Random(f'{self.seed}:{name}')
+
+    def _zipf(self, name, count, exponent):
+        """Накопленные веса Ципфа по случайно переставленным номерам."""
+        order = list(range(count))
+        self._rng(name).shuffle(order)
+        weights = [0.0] * count
+        for rank, index in enumerate(order, start=1):
+            weights[index] = 1 / rank ** exponent
+        return list(accumulate(weights))
+
+    def prepare(self):
+        fake = Faker('ru_RU')
+        fake.seed_instance(self.seed)
+        self.first_names = [fake.first_name() for _ in range(200)]
+        self.last_names = [fake.last_name() for _ in range(200)]
+        self.sentences = [fake.sentence(nb_words=12) for _ in range(1000)]
+        self.titles = [fake.catch_phrase() for _ in range(200)]
+        self.first = {
+            model: next_pk(model) for model in (User, Group, Post, Comment)
+        }
+        self.user_ids = range(
+            self.first[User], self.first[User] + self.sizes['users']
+        )
+        self.post_ids = range(
+            self.first[Post], self.first[Post] + self.sizes['posts']
+        )
+        # Писать и собирать подписчиков будут одни и те же популярные
+        # авторы, но посты распределены ровнее подписок.
+        self.writers = self._zipf('writers', self.sizes['users'], 0.8)
+        self.stars = self._zipf('stars', self.sizes['users'], self.exponent)
+
+    def _text(self, rng):
+        return ' '.join(rng.choices(self.sentences, k=rng.randint(1, 5)))
+
+    def users(self):
+        rng = self._rng('users')
+        password = make_password(PASSWORD)
+        for user_id in self.user_ids:
+            yield User(
+                pk=user_id, username=f'user{user_id}', password=password,
+                first_name=rng.choice(self.first_names),
+                last_name=rng.choice(self.last_names),
+            )
+
+    def groups(self):
+        rng = self._rng('groups')
+        first = self.first[Group]
+        for group_id in range(first, first + self.sizes['groups']):
+            yield Group(
+                pk=group_id, slug=f'group-{group_id}',
+                title=rng.choice(self.titles),
+                description=rng.choice(self.sentences),
+            )
+
+    def posts(self):
+        rng = self._rng('posts')
+        step = SPAN / max(self.sizes['posts'], 1)
+        groups = range(self.first[Group], self.first[Group]
+                       + self.sizes['groups'])
+        for number, post_id in enumerate(self.post_ids):
+            author_id, = rng.choices(self.user_ids, cum_weights=self.writers)
+            group_id = None
+            if groups and rng.random() < 0.7:
+                group_id = rng.choice(groups)
+            yield Post(
+                pk=post_id, author_id=author_id, group_id=group_id,
+                text=self._text(rng),
+                pub_date=START + step * number + rng.random() * step,
+            )
+
+    def comments(self):
+        rng = self._rng('comments')
+        first = self.first[Comment]
+        step = SPAN / max(self.sizes['posts'], 1)
+        for comment_id in range(first, first + self.sizes['comments']):
+            post_id = rng.choice(self.post_ids)
+            number = post_id - self.first[Post]
+            yield Comment(
+                pk=comment_id, post_id=post_id,
+                author_id=rng.choice(self.user_ids),
+                text=rng.choice(self.sentences),
+                pub_date=START + step * number + rng.random() * SPAN / 10,
+            )
+
+    def follows(self):
+        """
+        Каждый пользователь подписан в среднем на ``follows`` авторов,
+        авторы выбираются по весам Ципфа, без повторов и без себя.
+        """
+        rng = self._rng('follows')
+        limit = self.sizes['users'] - 1
+        for user_id in self.user_ids:
+            wanted = min(limit, rng.randint(0, 2 * self.follows_per_user))
+            authors = set()
+            for _ in range(wanted * 4):
+                if len(authors) >= wanted:
+                    break
+                author_id, = rng.choices(
+                    self.user_ids, cum_weights=self.stars
+                )
+                if author_id != user_id:
+                    authors.add(author_id)
+            for author_id in sorted(authors):
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    def _insert(self, model, rows, log):
+        total = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            total += len(batch)
+            log(f'{model.__name__}: {total}')
+        return total
+
+    def load(self, log=lambda message: None):
+        """Пишет набор в базу, возвращает число строк по таблицам."""
+        self.prepare()
+        with explicit_dates(Post, Comment):
+            return {
+                'users': self._insert(User, self.users(), log),
+                'groups': self._insert(Group, self.groups(), log),
+                'posts': self._insert(Post, self.posts(), log),
+                'comments': self._insert(Comment, self.comments(), log),
+                'follows': self._insert(Follow, self.follows(), log),
+            }
+
+
+def finish(log=lambda message: None):
+    """Пересчитывает то, что обычно поддерживают сигналы."""
+    log('Счётчики пользователей')
+    UserStats.objects.recount()
+    log('Ленты подписок')
+    timelines.rebuild_all()
+    log('Поисковый индекс')
+    search.rebuild()
+    log('Счета популярного')
+    trending.rebuild()
+    cache.clear()
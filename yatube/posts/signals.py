@@ -0,0 +1,177 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import feed_cache, search, thumbnails, timelines, trending
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+# Поля пользователя, которые выводит карточка поста.
+USER_CARD_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.change(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    UserStats.objects.change(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.change(instance.author_id, followers_count=1)
+        UserStats.objects.change(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserStats.objects.change(instance.author_id, followers_count=-1)
+    UserStats.objects.change(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.change(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    UserStats.objects.change(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, **kwargs):
+    if created:
+        timelines.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_trending(sender, instance, created, **kwargs):
+    if created:
+        trending.track_post(instance)
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous is not None and previous.group_id != instance.group_id:
+        trending.move_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_trending(sender, instance, created, **kwargs):
+    if created:
+        trending.record({instance.post_id: trending.COMMENT_WEIGHT})
+
+
+@receiver(post_save, sender=Follow)
+def follow_backfill(sender, instance, created, **kwargs):
+    if created:
+        timelines.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_trim(sender, instance, **kwargs):
+    timelines.trim(instance.user_id, instance.author_id)
+    timelines.demote(instance.author_id)
+
+
+def post_feeds(post):
+    return (
+        feed_cache.index_feed(),
+        feed_cache.group_feed(post.group_id),
+        feed_cache.profile_feed(post.author_id),
+        feed_cache.post_card(post.pk),
+    )
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_previous(sender, instance, **kwargs):
+    """Запоминает пост до правки: его ленты и картинку."""
+    instance._previous = None
+    if instance.pk is not None:
+        instance._previous = Post.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_invalidate_feeds(sender, instance, **kwargs):
+    feeds = set(post_feeds(instance))
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        feeds.update(post_feeds(previous))
+    feed_cache.invalidate(*feeds)
+
+
+@receiver(post_save, sender=Post)
+def post_schedule_thumbnails(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous is not None and previous.image == instance.image:
+        return
+    if instance.image:
+        transaction.on_commit(partial(thumbnails.schedule, instance.image))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_invalidate_card(sender, instance, **kwargs):
+    feed_cache.invalidate(feed_cache.post_card(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_cards(sender, instance, **kwargs):
+    """Карточки показывают адрес группы."""
+    feed_cache.invalidate(feed_cache.CARDS)
+
+
+def card_fields(user):
+    return [getattr(user, field) for field in USER_CARD_FIELDS]
+
+
+@receiver(pre_save, sender=User)
+def user_remember_card_fields(sender, instance, update_fields=None,
+                              **kwargs):
+    """Запоминает то, что карточки показывают об авторе, до сохранения."""
+    instance._card_fields = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(
+        USER_CARD_FIELDS
+    ):
+        return
+    instance._card_fields = list(User.objects.filter(
+        pk=instance.pk
+    ).values_list(*USER_CARD_FIELDS).first() or [])
+
+
+@receiver(post_save, sender=User)
+def user_invalidate_cards(sender, instance, created, **kwargs):
+    """
+    Вход, смена пароля и регистрация карточек не меняют: сбрасываются
+    они, только когда меняется имя автора.
+    """
+    previous = getattr(instance, '_card_fields', None)
+    if created or previous is None or previous == card_fields(instance):
+        return
+    feed_cache.invalidate(feed_cache.CARDS)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Group)
+def index_for_search(sender, instance, **kwargs):
+    search.index(instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Group)
+def unindex_for_search(sender, instance, **kwargs):
+    search.unindex(instance)
@@ -0,0 +1,120 @@
+"""
+Стеммер русского языка по алгоритму Snowball (Портера).
+
+Отрезает от слова окончания и суффиксы, чтобы «постов», «посту» и
+«пост» искались как одно слово. Слова не на кириллице возвращаются
+как есть (только в нижнем регистре).
+"""
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+     'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+     'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+     'ья', 'я'),
+)
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ость', 'ост'))
+
+CYRILLIC = re.compile('[а-я]')
+
+
+def _regions(word):
+    """Начала областей RV и R2 (см. описание алгоритма Snowball)."""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for start in range(1, len(word)):
+        if word[start] not in VOWELS and word[start - 1] in VOWELS:
+            r1 = start + 1
+            break
+    for start in range(r1 + 1, len(word)):
+        if word[start] not in VOWELS and word[start - 1] in VOWELS:
+            r2 = start + 1
+            break
+    return rv, r2
+
+
+@lru_cache(maxsize=None)
+def _candidates(endings):
+    after_vowel, plain = endings
+    return sorted(
+        [(ending, True) for ending in after_vowel]
+        + [(ending, False) for ending in plain],
+        key=lambda item: -len(item[0]),
+    )
+
+
+def _strip(word, start, endings):
+    """
+    Отрезает самое длинное окончание из ``endings``, целиком лежащее
+    после ``start``. Окончания первой группы отрезаются, только если
+    перед ними стоит «а» или «я». Возвращает слово и признак отреза.
+    """
+    for ending, needs_vowel in _candidates(endings):
+        if not word.endswith(ending) or len(word) - len(ending) < start:
+            continue
+        cut = len(word) - len(ending)
+        if needs_vowel:
+            if cut - 1 < start or word[cut - 1] not in 'ая':
+                continue
+        return word[:cut], True
+    return word, False
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC.search(word):
+        return word
+    rv, r2 = _regions(word)
+
+    word, found = _strip(word, rv, PERFECTIVE_GERUND)
+    if not found:
+        word, _ = _strip(word, rv, REFLEXIVE)
+        word, found = _strip(word, rv, ADJECTIVE)
+        if found:
+            word, _ = _strip(word, rv, PARTICIPLE)
+        else:
+            word, found = _strip(word, rv, VERB)
+            if not found:
+                word, _ = _strip(word, rv, NOUN)
+
+    word, _ = _strip(word, rv, ((), ('и',)))
+    word, _ = _strip(word, r2, DERIVATIONAL)
+
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    word, found = _strip(word, rv, SUPERLATIVE)
+    if found and word.endswith('нн'):
+        return word[:-1]
+    word, _ = _strip(word, rv, ((), ('ь',)))
+    return word
@@ -0,0 +1,53 @@
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+
+from core import routers
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def fragment_cache():
+    """Тот же кеш, что у тега ``{% cache %}``."""
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def card_key(post):
+    return make_template_fragment_key(
+        'post_card', [post.id, post.cache_version]
+    )
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """
+    Отрендеренные карточки постов страницы:
+    ``{% post_cards page_obj as cards %}``. Фрагменты всех карточек
+    читаются из кеша одним запросом по ключу из id и версии поста (см.
+    posts/feed_cache.py); недостающие рендерятся один раз
+    скомпилированным шаблоном и сохраняются тоже одним запросом.
+    """
+    posts = list(posts)
+    cache = fragment_cache()
+    keys = [card_key(post) if hasattr(post, 'cache_version') else None
+            for post in posts]
+    cached = cache.get_many([key for key in keys if key])
+    card = context.template.engine.get_template(CARD_TEMPLATE)
+    cards, rendered = [], {}
+    for key, post in zip(keys, posts):
+        html = cached.get(key)
+        if html is None:
+            with context.push(post=post):
+                html = card.render(context)
+            if key:
+                rendered[key] = html
+        cards.append(mark_safe(html))
+    if rendered:
+        cache.set_many(rendered, routers.cache_timeout(None))
+    return cards
@@ -0,0 +1,58 @@
+import mimetypes
+
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+# Ширина картинки в карточке: колонка контейнера на широких экранах,
+# весь экран на узких.
+CARD_SIZES = '(min-width: 1200px) 1110px, 100vw'
+
+
+@register.simple_tag
+def post_thumbnail(image, geometry, **options):
+    """
+    Готовая миниатюра картинки поста. Пока её режут в фоне, отдаёт
+    оригинал и просит нарезку (см. ``thumbnails.request``).
+    """
+    if not image:
+        return None
+    thumbnail = thumbnails.ready_thumbnail(image.name, geometry, options)
+    if thumbnail:
+        return thumbnail
+    thumbnails.request(image)
+    return image
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post, sizes=CARD_SIZES):
+    """
+    Картинка поста тегом ``<picture>``: браузер сам выбирает копию
+    подходящей ширины и формата, а миниатюра карточки (или оригинал)
+    остаётся запасным вариантом.
+    """
+    if not post.image:
+        return {'src': None}
+    srcsets = {}
+    for variant in post.image_variants.all():
+        srcsets.setdefault(variant.content_type, []).append(
+            f'{variant.file.url} {variant.width}w'
+        )
+    srcsets = {
+        content_type: ', '.join(items)
+        for content_type, items in srcsets.items()
+    }
+    return {
+        'src': post_thumbnail(
+            post.image, '960x339', crop='center', upscale=True
+        ),
+        'sources': [
+            (content_type, srcsets[content_type])
+            for content_type in thumbnails.VARIANT_TYPES
+            if content_type in srcsets
+        ],
+        'srcset': srcsets.get(mimetypes.guess_type(post.image.name)[0]),
+        'sizes': sizes,
+    }
@@ -1,6 +1,18 @@
+from importlib import import_module
+from io import StringIO
+
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from posts.models import Group, Post
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import search, seeding
+from posts.models import (
+    Comment, Follow, Group, Post, TimelineEntry, UserStats,
+)
 
 
 User = get_user_model()
@@ -60,3 +72,131 @@ class PostModelTest(TestCase):
                     post._meta.get_field(field).help_text,
                     expected_value
                 )
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_creation_and_deletion(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.author, text='Текст')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        author_stats = self.stats(self.author)
+        reader_stats = self.stats(self.reader)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+        self.assertEqual(reader_stats.comments_count, 1)
+        comment.delete()
+        follow.delete()
+        post.delete()
+        author_stats = self.stats(self.author)
+        reader_stats = self.stats(self.reader)
+        self.assertEqual(author_stats.posts_count, 0)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertEqual(reader_stats.following_count, 0)
+        self.assertEqual(reader_stats.comments_count, 0)
+
+    def test_recount_command_fixes_bulk_inserts(self):
+        """recount_stats учитывает записи, созданные в обход сигналов."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Текст {i}') for i in range(3)
+        )
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.author)
+        ])
+        call_command('recount_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+
+    def test_missing_row_is_recounted(self):
+        """Строка, которой не было, считается по таблицам, а не с нуля."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Текст {i}') for i in range(3)
+        )
+        UserStats.objects.filter(user=self.author).delete()
+        post = Post.objects.create(author=self.author, text='Текст')
+        Comment.objects.create(post=post, author=self.author, text='Текст')
+        stats = self.stats(self.author)
+        self.assertEqual(stats.posts_count, 4)
+        self.assertEqual(stats.comments_count, 1)
+
+    def test_migration_backfills_existing_users(self):
+        """Миграция 0010 заводит счётчики уже существующим пользователям."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Текст {i}') for i in range(3)
+        )
+        UserStats.objects.all().delete()
+        migration = import_module('posts.migrations.0010_userstats')
+        state = MigrationLoader(connection).project_state(
+            ('posts', '0010_userstats')
+        )
+        migration.backfill_stats(state.apps, None)
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+
+    def test_profile_does_not_count_posts(self):
+        """Профиль берёт число постов из счётчика, а не COUNT(*)."""
+        Post.objects.create(author=self.author, text='Текст')
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(
+                reverse('posts:profile', kwargs={'username': 'author'})
+            )
+        self.assertEqual(response.context['stats'].posts_count, 1)
+        for query in queries:
+            self.assertNotIn('COUNT(*)', query['sql'])
+
+
+class SeedTest(TestCase):
+    def index_names(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+            return {name for name, in cursor.fetchall()}
+
+    def test_dataset_is_deterministic(self):
+        """Один seed — один и тот же набор данных."""
+        def texts(seed):
+            dataset = seeding.Dataset(users=10, posts=20, seed=seed)
+            dataset.prepare()
+            return [(post.author_id, post.text) for post in dataset.posts()]
+
+        self.assertEqual(texts(1), texts(1))
+        self.assertNotEqual(texts(1), texts(2))
+
+    def test_seed_command(self):
+        """seed_yatube пишет пачками и пересчитывает производные данные."""
+        indexes = self.index_names()
+        call_command(
+            'seed_yatube', users=30, groups=3, posts=200, comments=50,
+            follows=5, batch_size=64, drop_indexes=True, stdout=StringIO(),
+        )
+        self.assertEqual(self.index_names(), indexes)
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 50)
+        self.assertGreater(
+            Post.objects.values('pub_date').distinct().count(), 100
+        )
+        self.assertEqual(
+            sum(UserStats.objects.values_list('posts_count', flat=True)), 200
+        )
+        expected = sum(
+            Post.objects.filter(author_id=author_id).count()
+            for author_id in Follow.objects.values_list('author', flat=True)
+        )
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+        word = Post.objects.first().text.split()[0]
+        self.assertTrue(search.search(word))
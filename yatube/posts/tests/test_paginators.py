@@ -0,0 +1,122 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginators import ELLIPSIS, CursorPaginator, elided_page_range
+
+User = get_user_model()
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Создание 25 постов, часть из которых с одинаковой датой"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=cls.user)
+            for i in range(25)
+        )
+        pub_date = Post.objects.first().pub_date
+        Post.objects.filter(pk__lte=5).update(pub_date=pub_date)
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def walk(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].next_cursor:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_forward_walk_visits_every_post_once(self):
+        """Проход по курсорам выдаёт все посты без дублей и пропусков."""
+        pages = self.walk(CursorPaginator(Post.objects.all(), 10))
+        seen = [post.pk for page in pages for post in page]
+        self.assertEqual(seen, self.expected)
+        self.assertEqual([page.number for page in pages], [1, 2, 3])
+
+    def test_previous_cursor_returns_same_page(self):
+        """Курсор назад возвращает ту же страницу, что и курсор вперёд."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first, second, third = self.walk(paginator)
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        self.assertEqual(back.number, 2)
+        back = paginator.page(back.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertIsNone(back.previous_cursor)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        """Битый курсор открывает первую страницу."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.get_page('не-курсор')
+        self.assertEqual(page.number, 1)
+        self.assertEqual(page[0].pk, self.expected[0])
+
+    def test_deep_page_does_not_count(self):
+        """Без подсчёта страница по курсору — ровно один запрос."""
+        paginator = CursorPaginator(Post.objects.all(), 10, count=False)
+        cursor = paginator.page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            page = CursorPaginator(
+                Post.objects.all(), 10, count=False
+            ).page(cursor)
+            self.assertIsNone(page.paginator.num_pages)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+    def test_paginator_links_use_cursor(self):
+        """Ссылки в паджинаторе ведут на курсоры соседних страниц."""
+        response = Client().get(
+            reverse('posts:profile', kwargs={'username': 'NoName'})
+        )
+        page_obj = response.context['page_obj']
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}')
+        self.assertEqual(page_obj.paginator.num_pages, 3)
+
+    def test_ascending_walk_and_back(self):
+        """По возрастанию проход вперёд и курсор назад сходятся."""
+        paginator = CursorPaginator(Post.objects.all(), 10, ascending=True)
+        pages = self.walk(paginator)
+        seen = [post.pk for page in pages for post in page]
+        self.assertEqual(seen, self.expected[::-1])
+        back = paginator.page(pages[2].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+
+    def test_count_limit_stops_counting(self):
+        """С count_limit подсчёт ограничен, а страниц «не меньше»."""
+        paginator = CursorPaginator(Post.objects.all(), 10, count_limit=20)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 21)
+        self.assertIn('LIMIT 21', queries[0]['sql'])
+        self.assertFalse(paginator.count_exact)
+        self.assertEqual(paginator.num_pages, 2)
+        exact = CursorPaginator(Post.objects.all(), 10, count_limit=30)
+        self.assertTrue(exact.count_exact)
+        self.assertEqual(exact.num_pages, 3)
+
+
+class ElidedPageRangeTest(TestCase):
+    def test_window_around_current_page(self):
+        """Края, окно вокруг текущей страницы и пропуски между ними."""
+        cases = {
+            (1, 5): [1, 2, 3, 4, 5],
+            (1, 100000): [1, 2, 3, ELLIPSIS, 100000],
+            (50, 100): [1, ELLIPSIS, 48, 49, 50, 51, 52, ELLIPSIS, 100],
+            (99, 100): [1, ELLIPSIS, 97, 98, 99, 100],
+            (4, 100): [1, 2, 3, 4, 5, 6, ELLIPSIS, 100],
+        }
+        for (number, num_pages), expected in cases.items():
+            with self.subTest(number=number, num_pages=num_pages):
+                self.assertEqual(
+                    list(elided_page_range(number, num_pages)), expected
+                )
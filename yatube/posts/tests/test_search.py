@@ -0,0 +1,136 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.stemmer import stem
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """Формы одного слова приводятся к одной основе."""
+        cases = (
+            ('пост', 'постов', 'постами', 'посту'),
+            ('красивая', 'красивыми', 'красивое'),
+            ('группа', 'группы', 'группой'),
+            ('ёлка', 'елки'),
+        )
+        for forms in cases:
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(word) for word in forms}), 1)
+
+    def test_latin_words_are_kept(self):
+        self.assertEqual(stem('Django'), 'django')
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Посты, комментарий и группа с общими словами"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.group = Group.objects.create(
+            title='Красивые горы', slug='mountains', description='Горы'
+        )
+        cls.post = Post.objects.create(
+            text='Поднялись на гору, видели красивых орлов.',
+            author=cls.user, group=cls.group,
+        )
+        cls.other = Post.objects.create(
+            text='Про орлов и орлов: орлы над горами.', author=cls.user,
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.user, text='Какая красивая гора!'
+        )
+
+    def assert_backend(self, backend):
+        with mock.patch.object(search, 'SEARCH_BACKEND', backend):
+            if backend == 'memory':
+                search.rebuild()
+            found = {(hit.kind, hit.object_id) for hit in search.search(
+                'красивые горы'
+            )}
+            self.assertEqual(found, {
+                ('post', self.post.pk),
+                ('comment', self.comment.pk),
+                ('group', self.group.pk),
+            })
+            hits = search.search('орлы')
+            self.assertEqual(hits[0].object_id, self.other.pk)
+
+            post = Post.objects.get(pk=self.post.pk)
+            post.text = 'Текст без совпадений'
+            post.save()
+            Comment.objects.filter(pk=self.comment.pk).delete()
+            found = {(hit.kind, hit.object_id) for hit in search.search(
+                'красивые горы'
+            )}
+            self.assertEqual(found, {('group', self.group.pk)})
+
+    def test_fts_index(self):
+        """Индекс FTS5 находит формы слов и следит за изменениями."""
+        self.assertIsInstance(search.get_index(), search.FtsIndex)
+        self.assert_backend('auto')
+
+    def test_memory_index(self):
+        """Индекс в памяти ведёт себя так же, как FTS5."""
+        self.assert_backend('memory')
+
+    def test_highlight(self):
+        """Подсвечиваются формы слов запроса, остальное экранируется."""
+        self.assertEqual(
+            search.highlight('<b>Орлы</b> над горами', 'орлов гора'),
+            '&lt;b&gt;<mark>Орлы</mark>&lt;/b&gt; над <mark>горами</mark>',
+        )
+
+    def test_empty_fts_table_is_filled_after_migrate(self):
+        """Пустую таблицу FTS5 из миграции заполняет post_migrate."""
+        if not isinstance(search.get_index(), search.FtsIndex):
+            self.skipTest('SQLite без FTS5')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        search.fill_index()
+        found = {(hit.kind, hit.object_id)
+                 for hit in search.search('красивые горы')}
+        self.assertIn(('post', self.post.pk), found)
+
+    def test_search_page(self):
+        """Страница поиска показывает находки с подсветкой и ссылками."""
+        response = self.client.get(reverse('posts:search'), {'q': 'гора'})
+        self.assertEqual(response.context['paginator'].count, 4)
+        self.assertContains(response, '<mark>гору</mark>')
+        self.assertContains(
+            response, reverse('posts:group_list', args=['mountains'])
+        )
+        self.assertContains(
+            response, reverse('posts:post_detail', args=[self.post.pk])
+        )
+
+    def test_post_without_author(self):
+        """Пост удалённого автора находится и показывается без имени."""
+        post = Post.objects.create(text='Сирота среди гор')
+        response = self.client.get(reverse('posts:search'), {'q': 'сирота'})
+        self.assertContains(
+            response, reverse('posts:post_detail', args=[post.pk])
+        )
+
+    def test_search_page_links_window(self):
+        """Номера страниц поиска — окно вокруг текущей и края."""
+        hits = [search.Hit('post', self.post.pk, 1.0)] * 1000
+        with mock.patch.object(search, 'search', return_value=hits):
+            response = self.client.get(
+                reverse('posts:search'), {'q': 'гора', 'page': 50}
+            )
+        self.assertEqual(
+            list(response.context['page_range']),
+            [1, '…', 48, 49, 50, 51, 52, '…', 100],
+        )
+        self.assertContains(response, 'page=100"')
+        self.assertNotContains(response, 'page=47"')
@@ -1,15 +1,32 @@
 from django.core.cache import cache
+import json
+import math
+import os
+import re
 import shutil
+from unittest import mock
 import tempfile
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from concurrent.futures import ThreadPoolExecutor
+from django.db import OperationalError, connection, connections
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from posts import (
+    comment_buffer, feed_cache, thumbnails, timelines, trending, views,
+)
 from posts.forms import CommentForm
+from posts.templatetags import post_cards
 
-from ..models import Follow, Comment, Group, Post
+from ..models import (
+    Follow, Comment, Group, Post, TimelineEntry, TrendingScore, UserStats,
+)
 from django import forms
 
 
@@ -204,24 +221,455 @@ class CommentTest(TestCase):
         self.assertEqual(Comment.objects.count(), comment_count)
 
     def test_index_page_cache(self):
-        """Тестирование кеширования галавной страницы"""
-        # Запрос к главной странице
-        response = self.authorized_client.get(reverse('posts:index'))
-        # Создание поста
+        """Главная кешируется, а новый пост сразу сбрасывает кеш ленты"""
+        # Первый запрос заполняет кеш, второй берёт страницу из кеша
+        self.authorized_client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as cold:
+            cache.clear()
+            self.authorized_client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as warm:
+            response = self.authorized_client.get(reverse('posts:index'))
+        feed_scan = 'ORDER BY "posts_post"."pub_date" DESC'
+        self.assertTrue(any(feed_scan in q['sql'] for q in cold))
+        self.assertFalse(any(feed_scan in q['sql'] for q in warm))
+        # Создание поста меняет версию ленты, и он виден без очистки кеша
         Post.objects.create(
             text='Тестовый текст для кэша',
         )
-        # Запрос к главной странице после создания поста
         response_1 = self.authorized_client.get(reverse('posts:index'))
-        # Сравнение 1го и 2го запроса на соответствие.
-        # Если Equal, значит в кеше
-        self.assertEqual(response.content, response_1.content)
-        # Очистка кеша
+        self.assertNotEqual(response.content, response_1.content)
+        self.assertContains(response_1, 'Тестовый текст для кэша')
+
+    def test_comment_refreshes_cached_card(self):
+        """Комментарий сбрасывает закешированную карточку поста"""
+        self.authorized_client.get(reverse('posts:index'))
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Тестовый коммент'},
+        )
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+
+@override_settings(COMMENT_BUFFER=True)
+class CommentBufferTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.buffer = comment_buffer.CommentBuffer(self.directory)
+        self.addCleanup(self.buffer.close)
+        patcher = mock.patch.object(comment_buffer, 'get_buffer',
+                                    return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def comment(self, text, post_id=None):
+        return self.client.post(
+            reverse('posts:add_comment', args=[post_id or self.post.pk]),
+            {'text': text},
+        )
+
+    def test_comments_are_written_in_one_batch(self):
+        """Комментарии ждут сброса и пишутся одним INSERT."""
+        for number in range(3):
+            self.comment(f'Комментарий {number}')
+        self.assertEqual(self.comment('').status_code, 302)
+        self.assertEqual(self.comment('Мимо', post_id=10 ** 6).status_code,
+                         404)
+        self.assertFalse(Comment.objects.exists())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(sum(
+            query['sql'].startswith('INSERT INTO "posts_comment"')
+            for query in queries
+        ), 1)
+        self.assertEqual(
+            list(self.post.comments.order_by('pk')
+                 .values_list('text', flat=True)),
+            ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'],
+        )
+        self.assertEqual(UserStats.objects.get(user=self.user)
+                         .comments_count, 3)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 3')
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(os.listdir(self.directory),
+                         [f'{os.getpid()}.jsonl'])
+
+    @override_settings(SQLITE_WRITE_RETRIES=0)
+    def test_failed_batch_is_kept(self):
+        """Пачка, которую не приняла база, записывается следующим сбросом."""
+        self.comment('Комментарий')
+        busy = OperationalError('database is locked')
+        with mock.patch.object(comment_buffer, 'save_comments',
+                               side_effect=busy):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(self.buffer.flush(), 1)
+
+    @override_settings(SQLITE_WRITE_RETRIES=0)
+    def test_batch_file_is_one_transaction(self):
+        """Сбой на второй части файла не оставляет записанной первую."""
+        self.buffer.batch_size = 2
+        for number in range(3):
+            self.comment(f'Комментарий {number}')
+        save = comment_buffer.save_comments
+
+        def save_first_chunk(records):
+            if Comment.objects.exists():
+                raise OperationalError('database is locked')
+            return save(records)
+
+        with mock.patch.object(comment_buffer, 'save_comments',
+                               side_effect=save_first_chunk):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(Comment.objects.count(), 3)
+
+    def test_orphans_of_dead_processes_are_written(self):
+        """Очередь упавшего процесса дописывает живой — хотя бы раз."""
+        with mock.patch.object(comment_buffer, 'is_alive',
+                               return_value=False):
+            with open(os.path.join(self.directory, '1.jsonl'), 'w') as file:
+                file.write(json.dumps({
+                    'post_id': self.post.pk, 'author_id': self.user.pk,
+                    'text': 'Из очереди',
+                }) + '\n{"post_id": ')
+            self.buffer.claim_orphans()
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertTrue(Comment.objects.filter(text='Из очереди').exists())
+
+    def test_failed_batches_are_not_claimed(self):
+        """Отложенная пачка умершего процесса остаётся отложенной."""
+        path = os.path.join(self.directory, '1-1.batch.failed')
+        with open(path, 'w') as file:
+            file.write('{"post_id": ')
+        with mock.patch.object(comment_buffer, 'is_alive',
+                               return_value=False):
+            with self.assertLogs(comment_buffer.logger, 'WARNING'):
+                self.buffer.claim_orphans()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.buffer.batches(), [])
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='NoName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_slug', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Тестовый текст {i}', author=cls.user,
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def listing(self, url):
+        return list(self.client.get(url).context['page_obj'])
+
+    def test_commented_post_ranks_first(self):
+        """Пост с комментариями поднимается выше более новых."""
+        post = self.posts[0]
+        for number in range(3):
+            Comment.objects.create(post=post, author=self.user,
+                                   text=f'Комментарий {number}')
+        posts = self.listing(reverse('posts:trending'))
+        self.assertEqual(posts[0], post)
+        self.assertEqual(set(posts), set(self.posts))
+
+    def test_group_trending(self):
+        """В группе — только её посты, и перенесённый пост переезжает."""
+        url = reverse('posts:group_trending', kwargs={'slug': 'test_slug'})
+        self.assertEqual(set(self.listing(url)),
+                         {post for post in self.posts if post.group})
+        post = self.posts[0]
+        post.group = self.group
+        post.save()
+        self.assertIn(post, self.listing(url))
+
+    @mock.patch.object(views, 'POSTS_ON_PAGE', 2)
+    def test_cursor_pages(self):
+        """Страницы по курсору идут по убыванию счёта без повторов."""
+        url = reverse('posts:trending')
+        seen, cursor = [], ''
+        while True:
+            page = self.client.get(f'{url}?cursor={cursor}'
+                                   if cursor else url).context['page_obj']
+            seen.extend(page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), len(self.posts))
+        scores = [post.score for post in seen]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_add_points(self):
+        """Счёт — log2 суммы затухающих весов событий."""
+        at = trending.EPOCH + trending.HALF_LIFE
+        score = trending.add_points(trending.points(1, at),
+                                    trending.points(2, at))
+        self.assertAlmostEqual(score, math.log2(3) + 1)
+        # Событие через период полураспада весит как два прежних.
+        self.assertAlmostEqual(trending.points(1, at + trending.HALF_LIFE),
+                               trending.points(2, at))
+
+    def test_missing_score_starts_from_publication(self):
+        """Пост без счёта получает вес публикации вместе с событием."""
+        post = self.posts[0]
+        TrendingScore.objects.filter(post=post).delete()
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        score = TrendingScore.objects.get(post=post).score
+        trending.rebuild()
+        self.assertAlmostEqual(
+            score, TrendingScore.objects.get(post=post).score, places=3
+        )
+
+    def test_rebuild_matches_incremental_scores(self):
+        """Пересчёт с нуля даёт те же счета, что и события."""
+        for post in self.posts[:3]:
+            Comment.objects.create(post=post, author=self.user, text='Текст')
+        scores = dict(TrendingScore.objects.values_list('post_id', 'score'))
+        TrendingScore.objects.all().delete()
+        self.assertEqual(trending.rebuild(), len(self.posts))
+        for post_id, score in TrendingScore.objects.values_list(
+            'post_id', 'score'
+        ):
+            with self.subTest(post_id=post_id):
+                self.assertAlmostEqual(score, scores[post_id], places=3)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Пост с 25 комментариями от пяти авторов"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+        authors = [
+            User.objects.create_user(username=f'Reader_{i}') for i in range(5)
+        ]
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=authors[i % 5], text=f'Коммент {i}')
+            for i in range(25)
+        )
+
+    def setUp(self):
         cache.clear()
-        # Запрос к главной странице после очистки кеша
-        response_2 = self.authorized_client.get(reverse('posts:index'))
-        # Сравнение2 и 3го запроса.
-        self.assertNotEqual(response_1.content, response_2.content)
+        self.url = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста первая порция комментариев, авторы — JOIN."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+            )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), views.COMMENTS_ON_PAGE)
+        self.assertEqual(comments[0].text, 'Коммент 0')
+        self.assertContains(response, f'cursor={comments.next_cursor}')
+        self.assertEqual(
+            sum('posts_comment' in query['sql'] for query in queries), 1
+        )
+
+    def test_endpoint_returns_next_chunk(self):
+        """Фрагмент и JSON отдают оставшиеся комментарии по курсору."""
+        first = self.client.get(self.url)
+        cursor = first.context['comments'].next_cursor
+        response = self.client.get(self.url, {'cursor': cursor})
+        self.assertContains(response, 'Коммент 24')
+        self.assertNotContains(response, 'Показать ещё')
+        data = self.client.get(
+            self.url, {'cursor': cursor, 'format': 'json'}
+        ).json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertEqual(data['comments'][0]['text'], 'Коммент 20')
+        self.assertIsNone(data['next_cursor'])
+
+    def test_endpoint_rejects_bad_cursor(self):
+        """Битый курсор во фрагменте — 404."""
+        response = self.client.get(self.url, {'cursor': 'не-курсор'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalResponseTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Автор с группой и постом, читатель"""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_slug', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url):
+        """Второй запрос отдаёт валидаторы, третий с ними получает 304."""
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('ETag'))
+        etag = response['ETag']
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        return etag
+
+    def test_unchanged_pages_are_not_modified(self):
+        """Листинги и пост отвечают 304 без выборки постов."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'NoName'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.revalidate(url)
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertFalse(any(
+                    'FROM "posts_post"' in query['sql']
+                    and 'LIMIT' in query['sql'] and 'posts_post"."id" =' not in
+                    query['sql'] for query in queries
+                ))
+
+    def test_comment_changes_validators(self):
+        """Комментарий меняет ETag ленты и поста."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        etags = [self.revalidate(url) for url in urls]
+        Comment.objects.create(post=self.post, author=self.reader, text='Да')
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_last_modified(self):
+        """Last-Modified ленты: с ним запрос получает 304."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test_slug'})
+        self.client.get(url)
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_follow_changes_profile_etag(self):
+        """Подписка меняет ETag профиля: кнопка и счётчики другие."""
+        self.client.force_login(self.reader)
+        url = reverse('posts:profile', kwargs={'username': 'NoName'})
+        etag = self.revalidate(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_pages_vary_on_cookie(self):
+        """Страницы зависят от сессии; для вошедших они private."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertIn('Cookie', response['Vary'])
+        self.assertNotIn('private', response['Cache-Control'])
+        self.client.force_login(self.reader)
+        for url in (url, reverse('posts:follow_index')):
+            response = self.client.get(url)
+            self.assertIn('Cookie', response['Vary'])
+            self.assertIn('private', response['Cache-Control'])
+            self.assertIn('no-cache', response['Cache-Control'])
+
+
+class PostCardsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=cls.user)
+            for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_read_from_fragment_cache(self):
+        """Карточки кешируются по версии и читаются одним get_many."""
+        response = self.client.get(reverse('posts:index'))
+        posts = list(response.context['page_obj'])
+        for post in posts:
+            self.assertIn(post.text, cache.get(post_cards.card_key(post)))
+        self.assertContains(response, '<hr>', count=len(posts) - 1)
+        with mock.patch.object(
+            cache, 'get_many', wraps=cache.get_many
+        ) as get_many:
+            self.client.get(reverse('posts:index'))
+        card_reads = [
+            call for call in get_many.call_args_list
+            if 'template.cache.post_card' in str(call)
+        ]
+        self.assertEqual(len(card_reads), 1)
+
+    def test_user_saves_keep_cards(self):
+        """Карточки сбрасывает только смена имени автора."""
+        def version():
+            return feed_cache.get_versions(feed_cache.CARDS)[feed_cache.CARDS]
+
+        before = version()
+        User.objects.create_user(username='Newcomer')
+        self.user.set_password('password')
+        self.user.save()
+        self.assertEqual(version(), before)
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        self.assertNotEqual(version(), before)
+
+
+class StreamingRenderTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+        Comment.objects.create(post=cls.post, author=cls.user, text='Первый')
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(STREAMING_RENDER=True)
+    def test_post_detail_streams_comments_after_head(self):
+        """Начало страницы уходит до запроса комментариев."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            self.assertTrue(response.streaming)
+            chunks = iter(response.streaming_content)
+            head = next(chunks).decode()
+            self.assertIn('Тестовый текст', head)
+            self.assertNotIn('Первый', head)
+            self.assertFalse(any(
+                'FROM "posts_comment"' in query['sql'] for query in queries
+            ))
+            rest = b''.join(chunks).decode()
+        self.assertIn('Первый', rest)
+        self.assertIn('</html>', rest)
 
 
 class FollowTest(TestCase):
@@ -287,3 +735,363 @@ class FollowTest(TestCase):
         response = self.user_2_client.get(reverse('posts:follow_index'))
         post_count1 = len(response.context.get('page_obj').object_list)
         self.assertEqual(post_count, post_count1)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Автор с группой и подписчик"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='NoName', first_name='Имя', last_name='Фамилия'
+        )
+        cls.follower = User.objects.create_user(username='Follower')
+        cls.client_follower = Client()
+        cls.client_follower.force_login(cls.follower)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            description='Описание тестовой группы',
+            slug='test_slug'
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def create_posts(self, count):
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=self.user,
+                 group=self.group)
+            for i in range(count)
+        )
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client_follower.get(url)
+        return len(queries)
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        """Число запросов ленты не растёт с числом постов на странице."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'NoName'}),
+            reverse('posts:follow_index'),
+        )
+        self.create_posts(2)
+        small_page = {url: self.count_queries(url) for url in urls}
+        self.create_posts(8)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), small_page[url])
+
+
+@override_settings(SQLITE_PRAGMAS={'journal_mode': 'wal',
+                                   'busy_timeout': 5000})
+class WriteContentionTest(TransactionTestCase):
+    THREADS = 8
+    COMMENTS = 15
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(text='Тестовый текст',
+                                        author=self.author)
+        self.readers = [
+            User.objects.create_user(username=f'reader{number}')
+            for number in range(self.THREADS)
+        ]
+
+    def hammer(self, reader):
+        client = Client()
+        client.force_login(reader)
+        try:
+            for number in range(self.COMMENTS):
+                client.post(
+                    reverse('posts:add_comment', args=[self.post.pk]),
+                    {'text': f'{reader.username} {number}'},
+                )
+            client.post(reverse('posts:profile_follow',
+                                args=[self.author.username]))
+        finally:
+            connections.close_all()
+
+    def assert_no_lost_writes(self):
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            list(pool.map(self.hammer, self.readers))
+        total = self.THREADS * self.COMMENTS
+        self.assertEqual(Comment.objects.filter(post=self.post).count(),
+                         total)
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.followers_count, self.THREADS)
+        self.assertEqual(
+            Follow.objects.filter(author=self.author).count(), self.THREADS
+        )
+        self.assertEqual(sum(
+            UserStats.objects.get(user=reader).comments_count
+            for reader in self.readers
+        ), total)
+
+    def test_concurrent_writes_are_retried(self):
+        """Параллельные комментарии и подписки не теряются."""
+        self.assert_no_lost_writes()
+
+    @override_settings(SQLITE_WRITER='queue')
+    def test_concurrent_writes_through_writer(self):
+        """Через поток-писатель записи тоже не теряются."""
+        self.assert_no_lost_writes()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Автор с тремя постами, популярный автор и читатель"""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.star = User.objects.create_user(username='Star')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        for i in range(3):
+            Post.objects.create(text=f'Тестовый текст {i}', author=cls.author)
+
+    def feed(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_follow_backfills_and_unfollow_trims_timeline(self):
+        """Подписка дописывает старые посты, отписка их убирает."""
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'NoName'})
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+        self.assertEqual(len(self.feed()), 3)
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'NoName'})
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.feed(), [])
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост попадает в ленту подписчика без JOIN с Follow."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Свежий пост', author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.feed()[0], 'Свежий пост')
+        for query in queries:
+            self.assertNotIn('INNER JOIN "posts_follow"', query['sql'])
+
+    def test_popular_author_is_merged_on_read(self):
+        """Посты популярного автора не раздаются, а добираются при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch.object(timelines, 'FANOUT_LIMIT', 1):
+            Follow.objects.create(user=self.reader, author=self.star)
+            Post.objects.create(text='Пост звезды', author=self.star)
+            self.assertFalse(
+                TimelineEntry.objects.filter(author=self.star).exists()
+            )
+            feed = self.feed()
+        self.assertEqual(feed[0], 'Пост звезды')
+        self.assertEqual(len(feed), 4)
+
+    def test_popularity_threshold_both_ways(self):
+        """Посты, вышедшие при популярности, остаются в ленте и после."""
+        fan = User.objects.create_user(username='Fan')
+        with mock.patch.object(timelines, 'FANOUT_LIMIT', 2):
+            Follow.objects.create(user=self.reader, author=self.star)
+            Post.objects.create(text='Пост до славы', author=self.star)
+            Follow.objects.create(user=fan, author=self.star)
+            Post.objects.create(text='Пост звезды', author=self.star)
+            self.assertEqual(
+                TimelineEntry.objects.filter(author=self.star).count(), 1
+            )
+            self.assertEqual(self.feed(), ['Пост звезды', 'Пост до славы'])
+            Follow.objects.filter(user=fan).delete()
+            self.assertEqual(
+                TimelineEntry.objects.filter(author=self.star).count(), 2
+            )
+            self.assertEqual(self.feed(), ['Пост звезды', 'Пост до славы'])
+            Follow.objects.create(user=fan, author=self.star)
+            Post.objects.create(text='Снова популярен', author=self.star)
+            self.assertEqual(self.feed()[0], 'Снова популярен')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Пост с картинкой"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.group = Group.objects.create(title='Тестовая группа', slug='test')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            group=cls.group,
+            image=SimpleUploadedFile(
+                name='thumb.gif', content=small_gif, content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def image_url(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        return response.context['post_list'].image.url, response.content
+
+    def test_original_is_shown_until_thumbnail_is_ready(self):
+        """До нарезки показывается оригинал, после — миниатюра."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            original, content = self.image_url()
+        schedule.assert_called_once()
+        self.assertIn(original.encode(), content)
+
+        with mock.patch.object(thumbnails, 'EXECUTOR', 'sync'):
+            thumbnails.schedule(self.post.image)
+        thumbnail = thumbnails.ready_thumbnail(
+            self.post.image.name, '960x339',
+            {'crop': 'center', 'upscale': True},
+        )
+        self.assertIsNotNone(thumbnail)
+        _, content = self.image_url()
+        self.assertIn(thumbnail.url.encode(), content)
+        self.assertNotIn(original.encode(), content)
+
+    def test_pending_image_is_requested_once(self):
+        """Пока миниатюры нет, рендеры не ставят нарезку снова и снова."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            self.image_url()
+            self.client.get(reverse('posts:index'))
+            self.image_url()
+        schedule.assert_called_once_with(self.post.image)
+
+    def test_image_is_scheduled_once(self):
+        """Одну картинку режет один воркер, повторы склеиваются."""
+        executor = mock.Mock()
+        with mock.patch.object(thumbnails, '_get_executor',
+                               return_value=executor):
+            thumbnails.schedule(self.post.image)
+            thumbnails.schedule(self.post.image)
+        executor.submit.assert_called_once_with(
+            thumbnails.generate, self.post.image.name
+        )
+        thumbnails._finish(self.post.image.name, thumbnails._run(list))
+
+    def test_variants_are_stored_and_offered_in_srcset(self):
+        """Копии картинки записываются с размерами и попадают в srcset."""
+        with mock.patch.object(thumbnails, 'EXECUTOR', 'sync'):
+            thumbnails.schedule(self.post.image)
+        variants = self.post.image_variants.all()
+        self.assertEqual(
+            {variant.content_type for variant in variants},
+            {'image/gif', 'image/webp'},
+        )
+        for variant in variants:
+            with self.subTest(content_type=variant.content_type):
+                self.assertEqual(
+                    (variant.width, variant.height),
+                    (thumbnails.VARIANT_WIDTHS[0], 170),
+                )
+                self.assertEqual(variant.size, variant.file.size)
+        response = self.client.get(reverse('posts:index'))
+        webp = variants.get(content_type='image/webp')
+        self.assertContains(
+            response,
+            f'<source type="image/webp" srcset="{webp.file.url} 480w"',
+        )
+
+    def test_replaced_variant_files_are_deleted(self):
+        """Повторная нарезка удаляет файлы прежних копий после коммита."""
+        with mock.patch.object(thumbnails, 'EXECUTOR', 'sync'), \
+                mock.patch.object(thumbnails.transaction, 'on_commit',
+                                  side_effect=lambda callback: callback()):
+            thumbnails.schedule(self.post.image)
+            old = [variant.file.name
+                   for variant in self.post.image_variants.all()]
+            cache.clear()
+            thumbnails.schedule(self.post.image)
+        self.assertTrue(old)
+        for name in old:
+            with self.subTest(name=name):
+                self.assertFalse(default_storage.exists(name))
+        for variant in self.post.image_variants.all():
+            self.assertTrue(default_storage.exists(variant.file.name))
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Автор с группой, подписчик, посты и комментарии"""
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_slug', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(12):
+            post = Post.objects.create(
+                text=f'Тестовый текст {i}', author=cls.author, group=cls.group
+            )
+        Comment.objects.create(post=post, author=cls.reader, text='Текст')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def plans(self, url):
+        """Планы SQLite для всех SELECT, выполненных при запросе ``url``."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                yield query['sql'], [row[-1] for row in cursor.fetchall()]
+
+    def test_listings_use_indexes(self):
+        """Листинги читают по индексу, без полного скана и сортировки."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'NoName'}),
+            reverse('posts:follow_index'),
+            reverse('posts:trending'),
+            reverse('posts:group_trending', kwargs={'slug': 'test_slug'}),
+        ]
+        for url in list(urls):
+            cursor = self.client.get(url).context['page_obj'].next_cursor
+            urls.append(f'{url}?cursor={cursor}')
+        urls.append(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        full_scan = re.compile(r'^SCAN (TABLE )?posts_\w+$')
+        for url in urls:
+            for sql, plan in self.plans(url):
+                with self.subTest(url=url, sql=sql):
+                    for step in plan:
+                        self.assertNotIn('TEMP B-TREE', step)
+                        self.assertIsNone(full_scan.match(step))
@@ -0,0 +1,270 @@
+"""
+Фоновая нарезка миниатюр картинок постов.
+
+Раньше ``{% thumbnail %}`` резал картинку прямо во время рендера
+первого запроса после публикации, и несколько таких запросов резали её
+одновременно. Теперь после сохранения поста с новой картинкой все
+размеры из ``POST_THUMBNAIL_SIZES`` режутся в пуле процессов
+(``POST_THUMBNAIL_EXECUTOR = 'process'``), а шаблонный тег
+``post_thumbnail`` до их готовности отдаёт оригинал.
+
+Там же режутся копии картинки для ``srcset``: несколько ширин из
+``POST_IMAGE_VARIANT_WIDTHS`` в исходном формате и в форматах из
+``POST_IMAGE_VARIANT_FORMATS``, которые умеет сохранять Pillow. Их
+размеры и вес записываются в ``PostImageVariant``.
+
+Одну картинку режет только один воркер: внутри процесса задачи
+склеиваются по имени файла, между процессами — блокировкой в кеше.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import (
+    BrokenExecutor, Future, ProcessPoolExecutor, ThreadPoolExecutor,
+)
+from functools import partial
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+logger = logging.getLogger(__name__)
+
+SIZES = getattr(settings, 'POST_THUMBNAIL_SIZES', (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+))
+EXECUTOR = getattr(settings, 'POST_THUMBNAIL_EXECUTOR', 'process')
+WORKERS = getattr(settings, 'POST_THUMBNAIL_WORKERS', 2)
+LOCK_TIMEOUT = 60
+REQUEST_TIMEOUT = 5 * 60
+
+VARIANT_WIDTHS = getattr(
+    settings, 'POST_IMAGE_VARIANT_WIDTHS', (480, 960, 1440)
+)
+Image.init()
+VARIANT_FORMATS = tuple(
+    format for format in getattr(
+        settings, 'POST_IMAGE_VARIANT_FORMATS', ('AVIF', 'WEBP')
+    ) if format in Image.SAVE
+)
+VARIANT_TYPES = tuple(Image.MIME[format] for format in VARIANT_FORMATS)
+# Копии режутся с теми же пропорциями, что и миниатюра карточки.
+VARIANT_RATIO = 339 / 960
+VARIANT_DIR = 'posts/variants'
+EXTENSIONS = {'JPEG': 'jpg'}
+
+_executor = None
+_pending = {}
+_lock = threading.Lock()
+
+
+def thumbnail_target(name, geometry, options):
+    """Файл миниатюры, который sorl создаст для этих параметров."""
+    backend = default.backend
+    source = ImageFile(name)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def ready_thumbnail(name, geometry, options):
+    """Уже нарезанная миниатюра или None; сама ничего не режет."""
+    return default.kvstore.get(thumbnail_target(name, geometry, options))
+
+
+def make_variants(name):
+    """
+    Сохраняет копии картинки для ``srcset`` и возвращает их описания.
+    Шире исходника режется только самая узкая копия.
+    """
+    with default_storage.open(name) as file:
+        source = Image.open(file)
+        source.load()
+    formats = (source.format, *VARIANT_FORMATS)
+    stem = PurePosixPath(name).stem
+    widths = [width for width in VARIANT_WIDTHS if width <= source.width]
+    variants = []
+    for width in widths or VARIANT_WIDTHS[:1]:
+        height = round(width * VARIANT_RATIO)
+        image = ImageOps.fit(source, (width, height), Image.LANCZOS)
+        for format in dict.fromkeys(formats):
+            if format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            buffer = BytesIO()
+            image.save(buffer, format=format)
+            extension = EXTENSIONS.get(format, format.lower())
+            saved = default_storage.save(
+                f'{VARIANT_DIR}/{stem}_{width}.{extension}',
+                ContentFile(buffer.getvalue()),
+            )
+            variants.append({
+                'file': saved,
+                'content_type': Image.MIME[format],
+                'width': width,
+                'height': height,
+                'size': buffer.tell(),
+            })
+    return variants
+
+
+def generate(name):
+    """
+    Режет миниатюры и копии картинки. Выполняется в воркере пула,
+    поэтому в базу не пишет, а возвращает описания копий.
+    """
+    from sorl.thumbnail import get_thumbnail
+    if not default.storage.exists(name):
+        return []
+    for geometry, options in SIZES:
+        get_thumbnail(name, geometry, **options)
+    return make_variants(name)
+
+
+def delete_unused_variants(names):
+    """Удаляет файлы копий, на которые больше не ссылается ни один пост."""
+    from .models import PostImageVariant
+    used = set(PostImageVariant.objects.filter(file__in=names).values_list(
+        'file', flat=True
+    ))
+    for name in set(names) - used:
+        default_storage.delete(name)
+
+
+def store_variants(name, variants):
+    """
+    Заменяет копии картинки у всех постов с этим файлом. Файлы прежних
+    копий удаляются после коммита.
+    """
+    from .models import Post, PostImageVariant
+    post_ids = list(
+        Post.objects.filter(image=name).values_list('pk', flat=True)
+    )
+    replaced = PostImageVariant.objects.filter(post__in=post_ids)
+    old_files = list(replaced.values_list('file', flat=True))
+    replaced.delete()
+    PostImageVariant.objects.bulk_create(
+        PostImageVariant(post_id=post_id, **variant)
+        for post_id in post_ids for variant in variants
+    )
+    if old_files:
+        transaction.on_commit(partial(delete_unused_variants, old_files))
+    return post_ids
+
+
+def _run(function, *args):
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if EXECUTOR == 'process':
+            _executor = ProcessPoolExecutor(
+                WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        else:
+            _executor = ThreadPoolExecutor(WORKERS)
+    return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _finish(name, future):
+    # Модуль импортируется и в воркерах до django.setup(), поэтому
+    # модели тянем только здесь.
+    from core.db import write
+
+    from . import feed_cache
+    with _lock:
+        post_ids = _pending.pop(name, set())
+    cache.delete(f'thumbnails:{name}')
+    if future.exception() is not None:
+        logger.error('Не удалось нарезать миниатюры %s', name,
+                     exc_info=future.exception())
+    else:
+        post_ids.update(write(store_variants, name, future.result()))
+    # Сбрасываем закешированное «миниатюры нет» и карточки постов,
+    # которые пока показывали оригинал.
+    for geometry, options in SIZES:
+        target = thumbnail_target(name, geometry, options)
+        default.kvstore.cache.delete(add_prefix(target.key))
+    feed_cache.invalidate(*(feed_cache.post_card(pk) for pk in post_ids))
+
+
+def request(image):
+    """
+    Нарезка по просьбе шаблона, который показал оригинал. Картинку,
+    за которой уже ходили, шаблоны не проверяют и не ставят в очередь
+    ещё ``REQUEST_TIMEOUT`` секунд: иначе каждая карточка каждого
+    запроса стоила бы обращения к хранилищу.
+    """
+    if cache.add(f'thumbnails:requested:{image.name}', 1, REQUEST_TIMEOUT):
+        schedule(image)
+
+
+def schedule(image):
+    """Ставит нарезку картинки поста в очередь, если её ещё не режут."""
+    name = image.name
+    try:
+        if not name or not image.storage.exists(name):
+            return
+    except SuspiciousFileOperation:
+        return
+    with _lock:
+        if name in _pending:
+            _pending[name].add(image.instance.pk)
+            return
+        if not cache.add(f'thumbnails:{name}', 1, LOCK_TIMEOUT):
+            return
+        _pending[name] = {image.instance.pk}
+    if EXECUTOR == 'sync':
+        _finish(name, _run(generate, name))
+        return
+    try:
+        future = _get_executor().submit(generate, name)
+    except BrokenExecutor as error:
+        # Пул сломался (воркер упал) — заводим новый к следующей задаче,
+        # а эта картинка пока показывается оригиналом.
+        _reset_executor()
+        future = Future()
+        future.set_exception(error)
+        _finish(name, future)
+        return
+    future.add_done_callback(partial(_finish, name))
@@ -0,0 +1,189 @@
+"""
+Лента подписок с раздачей постов при записи (fan-out-on-write).
+
+Новый пост автора сразу раскладывается по ``TimelineEntry`` всех его
+подписчиков, поэтому ``follow_index`` читает одну таблицу по индексу
+``(user, pub_date)`` вместо JOIN ``Post`` с ``Follow``. Посты авторов,
+у которых подписчиков не меньше ``TIMELINE_FANOUT_LIMIT``, не
+раздаются: их лента добирает при чтении (fan-out-on-read) и сливает
+с материализованной частью. Когда автор опускается ниже порога, его
+посты раздаются подписчикам задним числом (``demote``).
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.functional import cached_property
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginators import CursorPaginator, seek_condition
+
+FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+BATCH_SIZE = 500
+
+
+def is_celebrity(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id, followers_count__gte=FANOUT_LIMIT
+    ).exists()
+
+
+def _insert(entries):
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    if post.author_id is None or is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id)
+    _insert(
+        TimelineEntry(
+            user_id=user_id, post_id=post.pk,
+            author_id=post.author_id, pub_date=post.pub_date,
+        )
+        for user_id in followers.values_list('user', flat=True).iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """После подписки дописывает в ленту уже вышедшие посты автора."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by()
+    _insert(
+        TimelineEntry(
+            user_id=user_id, post_id=post_id,
+            author_id=author_id, pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.values_list('pk', 'pub_date')
+        .iterator()
+    )
+
+
+def trim(user_id, author_id):
+    """После отписки убирает посты автора из ленты."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+
+
+def demote(author_id):
+    """
+    Автор только что опустился ниже ``FANOUT_LIMIT``: его посты больше
+    не добираются при чтении. Раздаёт подписчикам те, что вышли, пока он
+    был популярен, и те, что не дописала подписка того времени.
+    """
+    if not UserStats.objects.filter(
+        user_id=author_id, followers_count=FANOUT_LIMIT - 1
+    ).exists():
+        return
+    posts = list(Post.objects.filter(author_id=author_id).order_by()
+                 .values_list('pk', 'pub_date'))
+    followers = Follow.objects.filter(author_id=author_id)
+    _insert(
+        TimelineEntry(
+            user_id=user_id, post_id=post_id,
+            author_id=author_id, pub_date=pub_date,
+        )
+        for user_id in followers.values_list('user', flat=True).iterator()
+        for post_id, pub_date in posts
+    )
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        authors = Follow.objects.filter(user_id=user_id)
+        for author_id in authors.values_list('author', flat=True):
+            backfill(user_id, author_id)
+
+
+def rebuild_all():
+    """
+    Собирает ленты всех пользователей заново одним ``INSERT ... SELECT``
+    вместо записи по подписке. Возвращает число записей.
+    """
+    quote = connection.ops.quote_name
+    tables = {
+        name: quote(model._meta.db_table) for name, model in (
+            ('entry', TimelineEntry), ('follow', Follow),
+            ('post', Post), ('stats', UserStats),
+        )
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        TimelineEntry.objects.all().delete()
+        cursor.execute(
+            f'INSERT INTO {tables["entry"]} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT DISTINCT follow.user_id, post.id, post.author_id, '
+            'post.pub_date '
+            f'FROM {tables["follow"]} follow '
+            f'JOIN {tables["post"]} post ON post.author_id = follow.author_id '
+            'WHERE follow.author_id NOT IN ('
+            f'SELECT user_id FROM {tables["stats"]} '
+            'WHERE followers_count >= %s)',
+            [FANOUT_LIMIT],
+        )
+        return cursor.rowcount
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Паджинатор ленты подписок.
+
+    Каждая страница — слияние двух keyset-выборок: записей
+    ``TimelineEntry`` пользователя и постов популярных авторов, на
+    которых он подписан. Из обеих берётся по ``per_page + 1`` позиций,
+    этого достаточно, чтобы слияние дало полную страницу.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(Post.objects.feed(), per_page, count=False)
+        self.user = user
+
+    @cached_property
+    def sources(self):
+        """
+        Выборки для слияния. Посты одного популярного автора читаются по
+        индексу ``(author, pub_date)`` без сортировки; IN по нескольким
+        авторам сортирует, но только их посты.
+        """
+        sources = [(TimelineEntry.objects.filter(user=self.user), 'post_id')]
+        celebrities = list(Follow.objects.filter(
+            user=self.user,
+            author__stats__followers_count__gte=FANOUT_LIMIT,
+        ).values_list('author', flat=True))
+        if len(celebrities) == 1:
+            sources.append(
+                (Post.objects.filter(author_id=celebrities[0]), 'pk')
+            )
+        elif celebrities:
+            sources.append(
+                (Post.objects.filter(author_id__in=celebrities), 'pk')
+            )
+        return sources
+
+    def _seek(self, value, pk, before):
+        positions = set()
+        for queryset, pk_field in self.sources:
+            if value is not None:
+                queryset = queryset.filter(seek_condition(
+                    'pub_date', pk_field, value, pk, before
+                ))
+            ordering = ('pub_date', pk_field)
+            if not before:
+                ordering = tuple(f'-{field}' for field in ordering)
+            positions.update(
+                queryset.order_by(*ordering)
+                .values_list('pub_date', pk_field)[:self.per_page + 1]
+            )
+        positions = sorted(positions, reverse=not before)
+        ids = [post_id for _, post_id in positions[:self.per_page + 1]]
+        posts = self.object_list.in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
@@ -0,0 +1,171 @@
+"""
+Лента популярного: посты по убыванию счёта с затуханием.
+
+Счёт поста — сумма весов событий, каждое из которых теряет половину
+веса за ``TRENDING_HALF_LIFE`` секунд: ``Σ wᵢ · 2^(−(t − tᵢ)/h)``.
+Множитель ``2^(−t/h)`` у всех постов общий и порядка не меняет, поэтому
+в ``TrendingScore`` хранится ``log2 Σ wᵢ · 2^((tᵢ − T₀)/h)``: новое
+событие прибавляется к нему одной операцией, старые счета не
+пересчитываются и не переполняются. Лента — один проход индекса
+``(score, post)`` (в группе — ``(group, score, post)``).
+
+События:
+
+* публикация: ``1 + TRENDING_FOLLOWER_WEIGHT · log2(1 + подписчики
+  автора)`` — пост автора, за которым следят, стартует выше;
+* комментарий: ``TRENDING_COMMENT_WEIGHT``.
+
+Удалённый комментарий счёт не уменьшает. ``rebuild_trending``
+пересчитывает все счета по постам и комментариям заново.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.functional import cached_property
+
+from . import feed_cache
+from .models import Comment, Post, TrendingScore, UserStats
+from .paginators import CursorPaginator, seek_condition
+
+HALF_LIFE = getattr(settings, 'TRENDING_HALF_LIFE', 6 * 60 * 60)
+COMMENT_WEIGHT = getattr(settings, 'TRENDING_COMMENT_WEIGHT', 1.0)
+FOLLOWER_WEIGHT = getattr(settings, 'TRENDING_FOLLOWER_WEIGHT', 0.5)
+# Начало отсчёта T₀: 2021-01-01 UTC.
+EPOCH = 1609459200
+BATCH_SIZE = 500
+
+
+def points(weight, at):
+    """Событие с весом ``weight`` в момент ``at`` в единицах счёта."""
+    return math.log2(weight) + (at - EPOCH) / HALF_LIFE
+
+
+def add_points(score, extra):
+    """``log2(2^score + 2^extra)`` без переполнения."""
+    high, low = max(score, extra), min(score, extra)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def publication_weight(followers):
+    return 1 + FOLLOWER_WEIGHT * math.log2(1 + followers)
+
+
+def publication_points(author_id, pub_date):
+    followers = UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+    return points(publication_weight(followers), pub_date.timestamp())
+
+
+def track_post(post):
+    """Заводит счёт новому посту."""
+    TrendingScore.objects.create(
+        post=post, group_id=post.group_id,
+        score=publication_points(post.author_id, post.pub_date),
+    )
+
+
+def move_post(post):
+    TrendingScore.objects.filter(post_id=post.pk).update(
+        group_id=post.group_id
+    )
+
+
+def record(weights, at=None):
+    """Прибавляет к счетам событие: ``{id поста: вес}``."""
+    at = time.time() if at is None else at
+    scores = TrendingScore.objects.in_bulk(list(weights))
+    for post_id, weight in weights.items():
+        extra = points(weight, at)
+        if post_id in scores:
+            TrendingScore.objects.filter(post_id=post_id).update(
+                score=add_points(scores[post_id].score, extra)
+            )
+            continue
+        # Пост появился до счетов, а rebuild_trending ещё не запускали:
+        # счёт начинается, как у нового поста, с веса публикации.
+        post = Post.objects.filter(pk=post_id).values_list(
+            'group_id', 'author_id', 'pub_date'
+        ).first()
+        if post is None:
+            continue
+        group_id, author_id, pub_date = post
+        TrendingScore.objects.create(
+            post_id=post_id, group_id=group_id,
+            score=add_points(publication_points(author_id, pub_date), extra),
+        )
+
+
+def rebuild():
+    """Пересчитывает все счета заново. Возвращает число постов."""
+    followers = dict(
+        UserStats.objects.values_list('user_id', 'followers_count')
+    )
+    scores, groups = {}, {}
+    posts = Post.objects.order_by().values_list(
+        'pk', 'group_id', 'author_id', 'pub_date'
+    )
+    for post_id, group_id, author_id, pub_date in posts.iterator():
+        groups[post_id] = group_id
+        scores[post_id] = points(
+            publication_weight(followers.get(author_id, 0)),
+            pub_date.timestamp(),
+        )
+    comments = Comment.objects.order_by().values_list('post_id', 'pub_date')
+    for post_id, pub_date in comments.iterator():
+        scores[post_id] = add_points(
+            scores[post_id], points(COMMENT_WEIGHT, pub_date.timestamp())
+        )
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            (
+                TrendingScore(post_id=post_id, group_id=groups[post_id],
+                              score=score)
+                for post_id, score in scores.items()
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    return len(scores)
+
+
+class TrendingPaginator(CursorPaginator):
+    """
+    Паджинатор ленты популярного: позиции ``(score, post)`` читаются из
+    ``TrendingScore`` по индексу, посты со счётом — одним запросом по id.
+    """
+
+    def __init__(self, per_page, group=None):
+        super().__init__(
+            Post.objects.feed().annotate(score=F('trending__score')),
+            per_page, key='score', count=False,
+        )
+        self.group = group
+
+    @cached_property
+    def key_field(self):
+        return TrendingScore._meta.get_field('score')
+
+    def _seek(self, value, pk, before):
+        scores = TrendingScore.objects.all()
+        if self.group is not None:
+            scores = scores.filter(group=self.group)
+        if value is not None:
+            scores = scores.filter(
+                seek_condition('score', 'post_id', value, pk, before)
+            )
+        ordering = ('score', 'post_id')
+        if not before:
+            ordering = tuple(f'-{field}' for field in ordering)
+        ids = list(scores.order_by(*ordering).values_list(
+            'post_id', flat=True
+        )[:self.per_page + 1])
+        posts = self.object_list.in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+    def _build_page(self, rows, *args, **kwargs):
+        feed_cache.attach_card_versions(rows)
+        return super()._build_page(rows, *args, **kwargs)
@@ -6,6 +6,11 @@ app_name = 'posts'
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path(
+        'group/<slug:slug>/trending/', views.group_trending,
+        name='group_trending'
+    ),
+    path('trending/', views.trending, name='trending'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
@@ -13,7 +18,11 @@ urlpatterns = [
     path(
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/comments/', views.post_comments, name='comments'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search_results, name='search'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
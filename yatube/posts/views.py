@@ -1,83 +1,233 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.core.cache.utils import make_template_fragment_key
 from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.template.loader import render_to_string
+from django.utils.functional import SimpleLazyObject
 
+from core.db import write
+from core.rendering import render_page
+from core.routers import read_from_replica
+
+from . import comment_buffer, feed_cache, search
+from .conditional import (
+    conditional_page, group_state, index_state, post_detail_state,
+    private_page, profile_state,
+)
+from .feed_cache import CachedCursorPaginator, CachedTimelinePaginator
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
+from .models import Follow, Group, Post, UserStats
+from .paginators import (
+    ELLIPSIS, CursorPaginator, InvalidCursor, elided_page_range,
+)
+from .templatetags.post_cards import fragment_cache
+from .trending import TrendingPaginator
 
 User = get_user_model()
 
+POSTS_ON_PAGE = 10
+COMMENTS_ON_PAGE = 20
+# Дальше 1000 страниц ленты посты не считаются: «из 1000+».
+FEED_COUNT_LIMIT = POSTS_ON_PAGE * 1000
+
 
-def paginator_for_all(data_for_paginator, request):
-    post_on_page = 10
-    paginator = Paginator(data_for_paginator, post_on_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def paginator_for_all(data_for_paginator, request, count=True, feed=None):
+    paginator = CachedCursorPaginator(
+        data_for_paginator, POSTS_ON_PAGE, feed=feed, count=count,
+        count_limit=FEED_COUNT_LIMIT,
+    )
+    cursor = request.GET.get('cursor')
+    page_obj = paginator.get_page(cursor)
     return {
         'paginator': paginator,
-        'page_number': page_number,
+        'cursor': cursor,
         'page_obj': page_obj,
     }
 
 
-@cache_page(20)
+def comment_paginator(post):
+    """Комментарии от старых к новым, автор приходит одним JOIN."""
+    return CursorPaginator(
+        post.comments.select_related('author'), COMMENTS_ON_PAGE,
+        count=False, ascending=True,
+    )
+
+
+@read_from_replica
+@conditional_page(index_state)
 def index(request):
-    posts = Post.objects.all()
+    posts = Post.objects.feed()
     title = 'Это главная страница проекта Yatube'
     context = {
         'posts': posts,
         'title': title,
     }
-    context.update(paginator_for_all(posts, request))
+    context.update(paginator_for_all(
+        posts, request, count=False, feed=feed_cache.index_feed()
+    ))
     return render(request, 'posts/index.html', context)
 
 
+@read_from_replica
+@conditional_page(group_state)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = group.posts.feed()
     title = 'Здесь будет информация о группах проекта Yatube'
     context = {
         'group': group,
         'posts': posts,
         'title': title,
     }
-    context.update(paginator_for_all(posts, request))
+    context.update(paginator_for_all(
+        posts, request, feed=feed_cache.group_feed(group.pk)
+    ))
     return render(request, 'posts/group_list.html', context)
 
 
+def trending_page(request, title, group=None):
+    paginator = TrendingPaginator(POSTS_ON_PAGE, group=group)
+    context = {
+        'title': title,
+        'group': group,
+        'paginator': paginator,
+        'page_obj': paginator.get_page(request.GET.get('cursor')),
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+@read_from_replica
+def trending(request):
+    return trending_page(request, 'Популярные записи Yatube')
+
+
+@read_from_replica
+def group_trending(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return trending_page(
+        request, f'Популярное в группе {group.title}', group=group
+    )
+
+
+@read_from_replica
+@conditional_page(profile_state)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    post_author = Post.objects.filter(author=author)
+    post_author = author.posts.feed()
+    stats = UserStats.objects.for_user(author)
     title = f' Профиль пользователя {author.get_full_name()}'
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
-        author__username=username).exists()
+        author=author).exists()
     context = {
         'author': author,
         'post_author': post_author,
+        'stats': stats,
         'title': title,
         'following': following,
     }
-    context.update(paginator_for_all(post_author, request))
+    context.update(paginator_for_all(
+        post_author, request, count=stats.posts_count,
+        feed=feed_cache.profile_feed(author.pk),
+    ))
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(post_detail_state)
 def post_detail(request, post_id):
     post_list = Post.objects.get(pk=post_id)
+    feed_cache.attach_card_versions([post_list])
+    stats = post_list.author and UserStats.objects.for_user(post_list.author)
     title = 'Подробнее о посте'
     form = CommentForm(request.POST or None)
-    comments = post_list.comments.all()
+    comments_cursor = request.GET.get('comments', '')
+    paginator = comment_paginator(post_list)
+    try:
+        paginator.decode_cursor(comments_cursor)
+    except InvalidCursor:
+        # Битый курсор — первая страница и общий с ней ключ кеша.
+        comments_cursor = ''
+    # Страница читается, только если блок комментариев не в кеше.
+    comments = SimpleLazyObject(lambda: paginator.get_page(comments_cursor))
     is_edit = True
     context = {
         'post_list': post_list,
+        'stats': stats,
         'title': title,
         'form': form,
         'comments': comments,
+        'comments_cursor': comments_cursor,
         'is_edit': is_edit,
     }
-    return render(request, 'posts/post_detail.html', context)
+
+    def comments_html():
+        cache = fragment_cache()
+        key = make_template_fragment_key('post_comments', [
+            post_list.id, post_list.cache_version, comments_cursor,
+        ])
+        html = cache.get(key)
+        if html is None:
+            html = render_to_string('posts/includes/comments.html', {
+                'post_id': post_list.id, 'comments': comments,
+            }, request)
+            cache.set(key, html, None)
+        yield html
+
+    return render_page(request, 'posts/post_detail.html', context, {
+        'comments_html': comments_html,
+    })
+
+
+def post_comments(request, post_id):
+    """
+    Следующая порция комментариев для кнопки «Показать ещё»: HTML-фрагмент
+    или JSON, если его просят через ``?format=json`` или ``Accept``.
+    """
+    post = get_object_or_404(Post, pk=post_id)
+    try:
+        page = comment_paginator(post).page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Некорректный курсор комментариев')
+    context = {'post_id': post.pk, 'comments': page}
+    if (request.GET.get('format') == 'json'
+            or 'application/json' in request.headers.get('Accept', '')):
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'pub_date': comment.pub_date.isoformat(),
+                }
+                for comment in page
+            ],
+            'next_cursor': page.next_cursor,
+            'html': render_to_string(
+                'posts/includes/comments.html', context, request
+            ),
+        })
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search_results(request):
+    query = request.GET.get('q', '').strip()
+    hits = search.search(query) if query else []
+    paginator = Paginator(hits, POSTS_ON_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'title': f'Поиск: {query}' if query else 'Поиск',
+        'query': query,
+        'paginator': paginator,
+        'page_obj': page_obj,
+        'page_range': list(
+            elided_page_range(page_obj.number, paginator.num_pages)
+        ),
+        'ellipsis': ELLIPSIS,
+        'results': search.results(page_obj.object_list, query),
+    }
+    return render(request, 'posts/search.html', context)
 
 
 def post_create(request):
@@ -88,7 +238,7 @@ def post_create(request):
         return render(request, 'posts/create_post.html', {'form': form})
     post = form.save(commit=False)
     post.author = request.user
-    post.save()
+    write(post.save)
     return redirect('posts:profile', request.user.username)
 
 
@@ -101,7 +251,7 @@ def post_edit(request, post_id):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            form.save()
+            write(form.save)
             return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -120,23 +270,23 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        if comment_buffer.enabled():
+            comment_buffer.get_buffer().add(comment)
+        else:
+            write(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_from_replica
 @login_required
+@private_page
 def follow_index(request):
-    posts_author = Post.objects.filter(
-        author__following__user=request.user
-    )
     title = 'Страница с избранными авторами'
-    paginator = Paginator(posts_author, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CachedTimelinePaginator(request.user, POSTS_ON_PAGE)
     context = {
         'title': title,
         'paginator': paginator,
-        'page_obj': page_obj,
+        'page_obj': paginator.get_page(request.GET.get('cursor')),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -145,7 +295,10 @@ def follow_index(request):
 def profile_follow(request, username):
     follow_user = get_object_or_404(User, username=username)
     if request.user != follow_user:
-        Follow.objects.get_or_create(user=request.user, author=follow_user)
+        write(
+            Follow.objects.get_or_create, user=request.user,
+            author=follow_user,
+        )
     return redirect('posts:profile', username=username)
 
 
@@ -154,5 +307,5 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     is_follower = Follow.objects.filter(user=request.user, author=author)
     if is_follower.exists():
-        is_follower.delete()
+        write(is_follower.delete)
     return redirect('posts:profile', username=username)
@@ -0,0 +1,24 @@
+// Кнопка «Показать ещё» догружает следующую порцию комментариев
+// на месте; без JavaScript ссылка открывает её отдельной страницей.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('[data-more]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  link.classList.add('disabled');
+  fetch(link.dataset.more, {credentials: 'same-origin'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      link.insertAdjacentHTML('beforebegin', html);
+      link.remove();
+    })
+    .catch(function () {
+      window.location = link.href;
+    });
+});
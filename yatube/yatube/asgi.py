@@ -0,0 +1,19 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 не умеет ASGI сам, поэтому WSGI-приложение (вместе с раздачей
+статики) оборачивается в ``WsgiToAsgi`` из ``asgiref``: запросы идут в
+пул потоков, как у потокового WSGI-сервера.
+
+    uvicorn yatube.asgi:application --workers 4
+"""
+
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.production')
+
+from yatube.wsgi import application as wsgi_application  # noqa: E402
+
+application = WsgiToAsgi(wsgi_application)
@@ -0,0 +1,41 @@
+"""
+Боевые настройки: ``DJANGO_SETTINGS_MODULE=yatube.production``.
+
+Всё как в ``settings``, но без отладки и тулбара, с соединениями с базой,
+которые живут между запросами, и SQLite в режиме WAL. Секретный ключ,
+адреса сайта и кеш берутся из окружения.
+"""
+import os
+
+# Отладка в бою выключена всегда: от неё зависят загрузчики шаблонов и
+# хранилище статики в settings.
+os.environ['YATUBE_DEBUG'] = '0'
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import (  # noqa: E402
+    ALLOWED_HOSTS, DATABASES, INSTALLED_APPS, MIDDLEWARE, SECRET_KEY,
+)
+
+SECRET_KEY = os.environ.get('YATUBE_SECRET_KEY', SECRET_KEY)
+ALLOWED_HOSTS = os.environ.get(
+    'YATUBE_ALLOWED_HOSTS', ','.join(ALLOWED_HOSTS)
+).split(',')
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
+MIDDLEWARE = [
+    name for name in MIDDLEWARE if not name.startswith('debug_toolbar.')
+]
+
+# Соединение переиспользуется запросами одного потока воркера минуту,
+# прагмы выполняются один раз на соединение.
+DATABASES['default']['CONN_MAX_AGE'] = int(
+    os.environ.get('YATUBE_CONN_MAX_AGE', 60)
+)
+# WAL: читатели не ждут писателя. synchronous=normal в WAL не теряет
+# целостность, только последние транзакции при отключении питания.
+# busy_timeout: писатели ждут друг друга до 5 секунд.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+}
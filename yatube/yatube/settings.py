@@ -11,6 +11,9 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
+
+from core.cache import cache_from_url
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -23,7 +26,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = '--1--'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('YATUBE_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -48,11 +51,15 @@ INSTALLED_APPS = [
     'about.apps.AboutConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
     'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,8 +104,39 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 0)),
+        # Тестовая база — файл, а не память: в общей памяти SQLite
+        # блокирует таблицы, а не базу, и не умеет WAL.
+        'TEST': {'NAME': os.path.join(
+            tempfile.gettempdir(), f'yatube-test-{os.getpid()}.sqlite3'
+        )},
     }
 }
+# Реплики для чтения лент (core/routers.py): YATUBE_REPLICAS — пути к
+# копиям базы через запятую, их обновляет manage.py sync_replicas.
+# Реплика, отставшая больше чем на REPLICA_MAX_LAG секунд, не читается;
+# после записи посетитель REPLICA_PIN_SECONDS секунд читает основную базу.
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get(
+        'YATUBE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], NAME=path, TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_MAX_LAG = 10
+REPLICA_PIN_SECONDS = 10
+# Прагмы каждого нового соединения SQLite (core/db.py); боевые — в
+# yatube/production.py.
+SQLITE_PRAGMAS = {}
+# Запись (core/db.py): сколько раз повторять транзакцию, которая не
+# дождалась блокировки базы, и пауза перед первым повтором, секунды.
+# SQLITE_WRITER: 'direct' — пишет поток запроса; 'queue' — один
+# поток-писатель на процесс, пачками до SQLITE_WRITER_BATCH записей.
+SQLITE_WRITE_RETRIES = 5
+SQLITE_WRITE_BACKOFF = 0.05
+SQLITE_WRITER = os.environ.get('YATUBE_SQLITE_WRITER', 'direct')
+SQLITE_WRITER_BATCH = 50
 
 
 # Password validation
@@ -143,6 +181,13 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 STATIC_URL = '/static/'
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+# Сборка для боя (core/static.py): collectstatic пишет файлы с хешем в
+# имени и их сжатые копии, wsgi.py отдаёт их с кешем на год.
+STATIC_ROOT = os.environ.get(
+    'YATUBE_STATIC_ROOT', os.path.join(BASE_DIR, 'collected_static')
+)
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.static.CompressedManifestStaticFilesStorage'
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -151,10 +196,72 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 
+# Адрес кеша, см. core/cache.py: locmem:// держит кеш в каждом процессе
+# отдельно, для нескольких воркеров нужен общий file://, memcached://
+# или redis://.
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': cache_from_url(
+        os.environ.get('YATUBE_CACHE_URL', 'locmem://'),
+        key_prefix=os.environ.get('YATUBE_CACHE_KEY_PREFIX', 'yatube'),
+        version=int(os.environ.get('YATUBE_CACHE_VERSION', 1)),
+    )
 }
 
+# Сколько живут закешированные списки постов страниц лент, секунды.
+FEED_CACHE_TIMEOUT = 60 * 15
+
+# Миниатюры картинок постов режутся в фоне после сохранения поста.
+# POST_THUMBNAIL_EXECUTOR: 'process' — пул процессов, 'thread' — пул
+# потоков, 'sync' — сразу в запросе.
+POST_THUMBNAIL_SIZES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+POST_THUMBNAIL_EXECUTOR = os.environ.get(
+    'YATUBE_THUMBNAIL_EXECUTOR', 'process'
+)
+POST_THUMBNAIL_WORKERS = 2
+# Копии картинок для srcset: ширины и форматы помимо исходного.
+# Форматы, которые не умеет сохранять установленный Pillow, пропускаются.
+POST_IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+POST_IMAGE_VARIANT_FORMATS = ('AVIF', 'WEBP')
+
+# Поиск: 'auto' — FTS5, если миграция смогла её завести, иначе индекс
+# в памяти процесса; 'memory' — всегда в памяти.
+SEARCH_BACKEND = 'auto'
+
+# Метрики view (core/metrics.py): каталог снимков процессов, период
+# сброса в секундах и адреса, с которых открыт /metrics (сотрудникам
+# он открыт всегда).
+METRICS_DIR = os.environ.get(
+    'YATUBE_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'yatube-metrics')
+)
+METRICS_FLUSH_INTERVAL = 10
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Буферизованный приём комментариев (posts/comment_buffer.py): файлы
+# очереди, период сброса в базу, секунды, и размер пачки.
+COMMENT_BUFFER = os.environ.get('YATUBE_COMMENT_BUFFER', '0') == '1'
+COMMENT_BUFFER_DIR = os.environ.get(
+    'YATUBE_COMMENT_BUFFER_DIR',
+    os.path.join(tempfile.gettempdir(), 'yatube-comments'),
+)
+COMMENT_BUFFER_INTERVAL = 0.2
+COMMENT_BUFFER_BATCH = 500
+
+# Авторы с таким числом подписчиков не раздают посты по лентам
+# подписчиков при публикации, их посты лента добирает при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Лента популярного (posts/trending.py): вес события вдвое падает за
+# TRENDING_HALF_LIFE секунд; веса комментария и подписчиков автора.
+TRENDING_HALF_LIFE = 6 * 60 * 60
+TRENDING_COMMENT_WEIGHT = 1.0
+TRENDING_FOLLOWER_WEIGHT = 0.5
+
+# Сжатие ответов (core/middleware.py): короче этого не сжимаем, байты.
+COMPRESSION_MIN_SIZE = 512
+# Потоковый рендер (core/rendering.py): начало страницы уходит клиенту до
+# того, как посчитаны тяжёлые блоки вроде комментариев.
+STREAMING_RENDER = os.environ.get('YATUBE_STREAMING_RENDER', '0') == '1'
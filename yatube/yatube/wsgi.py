@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# Собранную collectstatic статику отдаём без Django (core/static.py).
+from core.static import StaticFilesMiddleware  # noqa: E402
+
+application = StaticFilesMiddleware(application)